@@ -0,0 +1,291 @@
+""" Aggregates of the dashboard built without loading the order table.
+
+Streams an order file, one chunk at a time, into the aggregates the dashboard reads and saves them;
+the app then renders from them instead of from the order rows, so an export larger than memory
+still produces the dashboard:
+
+    python aggregates.py build orders.csv
+    SUPERSTORE_AGGREGATES=.superstore_cache/aggregates.pkl streamlit run superstore.py
+
+New orders are then folded in with work proportional to the batch, and the sales forecast is refit
+before the app picks up the new version:
+
+    python aggregates.py append new_orders.csv
+"""
+import argparse
+import os
+import time
+import uuid
+
+import pandas as pd
+
+from cube import METRICS, build_cube, merge_cubes, month_end_index, monthly_series, rollup
+from forecast import get_forecast
+from ingest import CACHE_DIR, CHUNK_SIZE, CSV_DTYPES, preprocess, read_chunks
+from shared import SharedDataset
+from topk import Leaderboard
+
+
+# Number of chunk cubes held before they are merged into one
+MERGE_EVERY = 8
+
+AGGREGATES_FILE = os.path.join(CACHE_DIR, "aggregates.pkl")
+
+# Keys of the metric sums behind the geo index and the top-cities charts, see geo.GeoIndex
+GEO_KEYS = ['Order_Year', 'State', 'City']
+
+# Entities with leaderboards kept in the aggregates; the cities one is built from the geo sums
+LEADERBOARD_ENTITIES = ['Product_ID', 'Customer_Name']
+
+
+
+class RunningAggregates:
+
+    """ dashboard aggregates built from order rows fed in one chunk at a time.
+
+    Holds the rollup cube (and through it the KPIs and the state and category rollups), the monthly
+    totals, the metric sums per year, state and city, the product and customer leaderboards and the
+    exact sets of distinct products and customers, overall and per year, but never the order rows
+    themselves. Each chunk costs work proportional to its own size.
+
+    Every appended batch is a new generation, and each (year, month) period records the generation
+    that last changed it; the app keeps the figures of a year across versions of the aggregates for
+    as long as no batch touched the year, see year_stamps. """
+
+    def __init__(self):
+        self.pending = []
+        self.merged = None
+        self.pending_geo = []
+        self.geo_merged = None
+        self.leaderboards = {}
+        self.monthly = None
+        self.rows = 0
+        self.products = set()
+        self.customers = set()
+        self.customers_per_year = {}
+        self.build_id = uuid.uuid4().hex
+        self.generation = 0
+        self.changed = {}
+
+    def add(self, chunk):
+
+        """ folds a preprocessed frame of order rows into the aggregates """
+
+        if len(chunk) == 0:
+            return
+
+        self.rows += len(chunk)
+        self.products.update(chunk['Product_ID'].unique())
+        self.customers.update(chunk['Customer_ID'].unique())
+        for year, customers in chunk.groupby('Order_Year')['Customer_ID'].unique().items():
+            self.customers_per_year.setdefault(int(year), set()).update(customers)
+
+        for entity in LEADERBOARD_ENTITIES:
+            if entity in self.leaderboards:
+                self.leaderboards[entity].update(chunk)
+            else:
+                self.leaderboards[entity] = Leaderboard.from_rows(chunk, entity)
+
+        delta = build_cube(chunk)
+        self.pending.append(delta)
+        self.pending_geo.append(chunk.groupby(GEO_KEYS, observed=True)[METRICS].sum().reset_index())
+        if len(self.pending) >= MERGE_EVERY:
+            self._merge()
+
+        # Monthly totals are updated in place from the chunk's own rollup
+        months = rollup(delta, ['Order_Year', 'Order_Month'], METRICS + ['Count'])
+        months.index = month_end_index(months)
+        for year, month in zip(months.index.year, months.index.month):
+            self.changed[int(year), int(month)] = self.generation
+
+        months = months[METRICS + ['Count']]
+        if self.monthly is not None:
+            # Months missing on either side make add() float, so the counts are cast back
+            months = self.monthly.add(months, fill_value=0).astype(dict(Quantity='int64', Count='int64'))
+        self.monthly = months
+
+    def append(self, new_rows):
+
+        """ folds a batch of new raw order rows, in the schema of the order file, into the
+        aggregates as a new generation and returns the (year, month) periods it touched """
+
+        chunk = preprocess(new_rows, sort=False)
+        self.generation += 1
+        self.add(chunk)
+        return sorted(set(zip(chunk['Order_Date'].dt.year, chunk['Order_Date'].dt.month)))
+
+    def _merge(self):
+        cubes = self.pending if self.merged is None else [self.merged] + self.pending
+        self.merged = merge_cubes(cubes)
+        self.pending = []
+
+        tables = self.pending_geo if self.geo_merged is None else [self.geo_merged] + self.pending_geo
+        self.geo_merged = merge_cubes(tables, GEO_KEYS)
+        self.pending_geo = []
+
+    @property
+    def cube(self):
+        if self.pending:
+            self._merge()
+        return self.merged
+
+    @property
+    def geo(self):
+
+        """ returns the metric sums per (Order_Year, State, City) """
+
+        if self.pending:
+            self._merge()
+        return self.geo_merged
+
+    def year_stamps(self):
+
+        """ returns {year: stamp}, where the stamp of a year changes whenever a batch touches one of
+        its months and is unique to these aggregates """
+
+        generations = {}
+        for (year, month), generation in self.changed.items():
+            generations[year] = max(generations.get(year, 0), generation)
+
+        return {year: (self.build_id, generation) for year, generation in generations.items()}
+
+    def key_indicators(self):
+        monthly = self.monthly
+        return dict(
+            unique_products = len(self.products),
+            unique_customers = len(self.customers),
+            total_sales = monthly["Sales"].sum(),
+            total_products_sold = int(monthly["Quantity"].sum()),
+            total_discounts = monthly["Discount"].sum(),
+            net_profit = monthly["Profit"].sum())
+
+    def unique_customers(self, year):
+        return len(self.customers_per_year.get(int(year), ()))
+
+    def monthly_series(self, metric="Sales"):
+
+        """ returns metric per calendar month over the full month range, as cube.monthly_series """
+
+        monthly = self.monthly.sort_index()
+        full_range = pd.date_range(monthly.index.min(), monthly.index.max(), freq='M')
+        return monthly[[metric]].reindex(full_range, fill_value=0)
+
+    def state_totals(self, metrics=METRICS):
+        return rollup(self.cube, "State", metrics)
+
+    def category_totals(self, cat, metrics=METRICS):
+        return rollup(self.cube, [cat, "Order_Year"], metrics)
+
+    def save(self, path=AGGREGATES_FILE):
+        if self.pending:
+            self._merge()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        # The attributes rather than the object, so a file saved by `python aggregates.py` (where the
+        # class lives in __main__) loads anywhere
+        pd.to_pickle(vars(self), tmp_path)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path=AGGREGATES_FILE):
+        aggregates = RunningAggregates()
+        aggregates.__dict__.update(pd.read_pickle(path))
+        return aggregates
+
+
+
+# ______________________________________________ PIPELINES _________________________________________________________________
+def stream_aggregates(csv_path, chunksize=CHUNK_SIZE):
+
+    """ returns the dashboard's aggregates of an order file too large to load, folding one chunk
+    at a time into a RunningAggregates so only a chunk and the aggregates are held in memory """
+
+    aggregates = RunningAggregates()
+    for chunk in read_chunks(csv_path, chunksize):
+        aggregates.add(chunk)
+
+    return aggregates
+
+
+def build_aggregates(csv_path, path=AGGREGATES_FILE, chunksize=CHUNK_SIZE):
+
+    """ streams csv_path into aggregates, saves them to path and returns them """
+
+    aggregates = stream_aggregates(csv_path, chunksize)
+    aggregates.save(path)
+    return aggregates
+
+
+def refresh_forecast(aggregates):
+
+    """ fits the sales forecast of the series the app derives from the aggregates' cube, so the app
+    serves it up to date instead of refitting it in the background """
+
+    return get_forecast(monthly_series(aggregates.cube, "Sales"), background=False)
+
+
+def append_orders(new_rows, path=AGGREGATES_FILE, base=None, forecast=True):
+
+    """ appends a batch of new raw order rows to the aggregates stored at path and returns the
+    (year, month) periods it touched.
+
+    Without stored aggregates, they are first streamed from the order file base, or start empty.
+    When the batch touched any month, the sales forecast is refit (unless forecast is False) before
+    the aggregates are saved, so the app never serves the new version with a stale forecast """
+
+    if os.path.exists(path):
+        aggregates = RunningAggregates.load(path)
+    else:
+        aggregates = stream_aggregates(base) if base is not None else RunningAggregates()
+
+    touched = aggregates.append(new_rows)
+    if touched and forecast:
+        refresh_forecast(aggregates)
+
+    aggregates.save(path)
+    return touched
+
+
+
+# ______________________________________________ SERVE _____________________________________________________________________
+class StoredAggregates(SharedDataset):
+
+    """ the aggregates saved at a path, loaded once per version of the file and shared by every
+    session the way SharedDataset shares the order table """
+
+    def _load(self):
+        return RunningAggregates.load(self.csv_path)
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream an order file into the dashboard's aggregates.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="stream an order file into the aggregates")
+    build.add_argument("csv", help="order file")
+    build.add_argument("--out", default=AGGREGATES_FILE, help="aggregates file")
+    build.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help="rows read at a time")
+
+    append = commands.add_parser("append", help="fold a batch of new orders into the aggregates")
+    append.add_argument("csv", help="new order rows, in the layout of the order file")
+    append.add_argument("--out", default=AGGREGATES_FILE, help="aggregates file")
+    append.add_argument("--base", help="order file to build the aggregates from when the aggregates file does not exist")
+    append.add_argument("--no-forecast", action="store_true", help="leave the forecast to the app")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command == "build":
+        aggregates = build_aggregates(args.csv, args.out, args.chunksize)
+        print("{:,} order lines into {} in {:.1f}s".format(aggregates.rows, args.out, time.perf_counter() - start))
+        return
+
+    new_rows = pd.read_csv(args.csv, encoding='latin1', dtype=CSV_DTYPES)
+    touched = append_orders(new_rows, args.out, args.base, forecast=not args.no_forecast)
+    print("{:,} order lines into {} in {:.1f}s, changed months: {}".format(
+        len(new_rows), args.out, time.perf_counter() - start,
+        ", ".join("{}-{:02d}".format(year, month) for year, month in touched) or "none"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+import os
+import threading
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objs as pg
+import plotly.graph_objects as go
+
+from shared import shared_dataset
+from registry import Registry
+from forecast import get_forecast, load_selection
+from batch_forecast import load_segment_forecasts
+from backends import AggregatesBackend, PandasBackend, open_backend
+from aggregates import StoredAggregates
+from periods import period_tables
+from charts import category_histogram, category_pie
+from topk import Leaderboard
+from cube import METRICS, year_slice, monthly_series, quarterly_series
+
+
+
+# Artifacts are computed only when the selected page needs them
+registry = Registry()
+
+DATA_FILE = "Sample_Superstore.csv"
+
+# Categories charted in the "Further Analysis and Plots" sections
+CATEGORIES = ["Category", "Sub_Category", "Order_Day", "Order_Month", "Region", "Ship_Mode"]
+
+# Performance indicator -> (metric, colors of the 4-year histograms, colors of the per-year pies)
+INDICATORS = {
+    "Profit Margin": ("Profit", px.colors.sequential.tempo, px.colors.sequential.Teal),
+    "Sales": ("Sales", px.colors.sequential.Brwnyl, px.colors.sequential.Brwnyl),
+    "Quantity = Units sold": ("Quantity", px.colors.sequential.Teal, px.colors.sequential.tempo),
+}
+
+# Order table shared read-only by every session; each run leases the current version of the data file,
+# and every cached result below is keyed on that version instead of on the frame contents
+shared = shared_dataset(DATA_FILE)
+
+# Optional SQL backend the aggregations are pushed down to instead of loading the order file into pandas,
+# e.g. duckdb:orders.parquet or sqlite:orders.db (see backends.py)
+BACKEND = os.environ.get("SUPERSTORE_BACKEND")
+sql_backend = open_backend(BACKEND) if BACKEND else None
+
+# Optional aggregates streamed from an order file too large to load (python aggregates.py build), which the
+# artifacts then read instead of the order rows
+AGGREGATES = os.environ.get("SUPERSTORE_AGGREGATES")
+stored_aggregates = StoredAggregates(AGGREGATES) if AGGREGATES else None
+
+# What each run leases a dataset version of
+if sql_backend is not None:
+    dataset = sql_backend
+elif stored_aggregates is not None:
+    dataset = stored_aggregates
+else:
+    dataset = shared
+
+
+
+# ____________________________________________ DATA PREPROCESSING AND FEATURE ENGINEERING ______________________________________
+# Read csv file (converted once to a typed Arrow file and memory-mapped once per process), or query the
+# SQL backend, or read the stored aggregates. Not memoized: the shared dataset and the stored aggregates
+# already hold the single copy, outside the cache's memory cap
+@registry.artifact(memoize=False)
+def backend(version):
+    if sql_backend is not None:
+        return sql_backend
+    if stored_aggregates is not None:
+        return AggregatesBackend(stored_aggregates.data(version))
+    return PandasBackend(shared.data(version), version)
+
+
+# Compact rollup of the four metrics over every dimension the charts group by
+@registry.artifact
+def cube(backend):
+    return backend.cube()
+
+
+
+# ____________________________________________ KEY INDICATORS ________________________________________________________________
+@registry.artifact
+def key_indicators(backend, periods):
+    totals = periods["Y"][METRICS].sum()
+    distinct = backend.distinct_counts()
+    return dict(
+        unique_products = distinct["products"],
+        unique_customers = distinct["customers"],
+        total_sales = totals["Sales"],
+        total_products_sold = int(totals["Quantity"]),
+        total_discounts = totals["Discount"],
+        net_profit = totals["Profit"])
+
+
+
+# ________________________________________________ Group sales per month _______________________________________________________
+@registry.artifact
+def months_df(cube):
+    return monthly_series(cube, "Sales")
+
+
+# Cumulative monthly sales over all 4 years plot
+@registry.artifact
+def months_fig(months_df):
+    months_fig = px.line(months_df, x=months_df.index, y="Sales", title="Monthly sales over the 4-year period", 
+                        color_discrete_sequence=['darkblue'])
+    months_fig.update_traces(hovertemplate=None)
+    months_fig.update_xaxes(title_text='Month and Year')
+    months_fig.update_yaxes(title_text='Sales ($)')
+    return months_fig
+
+
+# Monthly plot per year 
+@registry.artifact
+def year_fig(months_df):
+    year_fig = px.line(months_df, x = months_df.index.month, y="Sales", color=months_df.index.year,
+                 labels = dict(x = "Month", y='Sales ($)', color="Year"), title = "Comparison of the monthly sales for 2014, 2015, 2016, and 2017", 
+                 markers=True, color_discrete_sequence=['Midnight blue', 'maroon','pink', 'cadetblue'])
+    year_fig.update_layout( hovermode='x unified',
+                            xaxis = dict(
+                                tickmode = 'array',
+                                tickvals = np.arange(1,13),
+                                ticktext = ['January', 'February', 'March', 'April', 'May', 'June', 'July','August', 
+                                                    'September', 'October', 'November', 'December']
+                                        ))
+    return year_fig
+
+
+
+# ________________________________________________ FORECASTING ______________________________________________________
+# Stored predictions are reused; a changed series is refit in the background from the previous parameters.
+# Not memoized, so the page picks up the refit predictions once they are stored
+@registry.artifact(memoize=False)
+def forecast(months_df):
+    return get_forecast(months_df)
+
+
+# Model the forecast uses and its backtest errors, once backtest.py has selected it
+@registry.artifact(memoize=False)
+def forecast_model():
+    return load_selection().get("Sales")
+
+
+@registry.artifact(memoize=False)
+def forecast_fig(months_df, forecast):
+    predictions, forecast_up_to_date = forecast
+
+    forecast_fig = go.Figure()
+    forecast_fig.add_trace(go.Scatter(x=months_df.index, y=months_df["Sales"], mode='lines', name='Original sales'))
+    forecast_fig.add_trace(go.Scatter(x= predictions.index, y = predictions['predicted_mean'], mode='lines',
+                            name='Predicted sales'))
+    forecast_fig.update_xaxes(title_text='Month and Year')
+    forecast_fig.update_yaxes(title_text='Sales ($)')
+    forecast_fig.update_layout(title = 'Previous sales per month for 2014 - 2017 (in blue) and forecasted sales (in red) for 2018)',
+    autosize=False, width=1200, height=600)
+    return forecast_fig
+
+
+
+# ________________________________________________  Overall monthly and quarter plots _____________________________________
+@registry.artifact
+def quarter_df(cube):
+    return quarterly_series(cube, "Sales")
+
+
+@registry.artifact
+def seasonal_plots(months_df, quarter_df):
+
+    """ returns the matplotlib month and quarter seasonal plots """
+
+    from statsmodels.graphics.tsaplots import month_plot, quarter_plot
+
+    # Month plot
+    month_plot_fig = month_plot(months_df)
+    month_plot_fig.tight_layout()
+    month_plot_fig.set_figheight(2)
+    month_plot_fig.set_figwidth(5)
+
+    # Quarter plot
+    quarter_plot_fig = quarter_plot(quarter_df)
+    quarter_plot_fig.tight_layout()
+    quarter_plot_fig.set_figheight(2)
+    quarter_plot_fig.set_figwidth(5)
+
+    return month_plot_fig, quarter_plot_fig
+
+
+
+# ________________________________________________ GEO-PLOT ______________________________________________________
+
+# State codes are resolved once per distinct state; the index also feeds the top-10 cities charts
+@registry.artifact
+def geo_index(backend):
+    return backend.geo_index()
+
+
+@registry.artifact
+def geo_fig(geo_index):
+    geo_grouped = geo_index.state_totals("Sales")
+    geo_data = dict(type='choropleth', locations=geo_grouped["State_code"], locationmode="USA-states",
+                    z=geo_grouped['Sales'], colorscale="pubu", colorbar={'title': 'Total Sales'})
+
+    geo_layout = dict(title="4-year geographical sales distribution of USA", width = 1000, height=600,
+                        geo=dict(scope='usa', showlakes=True, lakecolor = 'rgb(0, 200, 250)'))
+
+    return pg.Figure(data=geo_data, layout=geo_layout)
+
+
+
+# ________________________________________________ TOP-10 ______________________________________________________
+# Length and metric of the pages' top-10 charts
+TOP_K = 10
+TOP_METRIC = "Quantity"
+
+
+# Precomputed per-year and overall leaderboards; the cities one is built from the geo index
+@registry.artifact
+def leaderboards(backend, geo_index):
+    return dict(
+        Product_ID = backend.leaderboard("Product_ID"),
+        Customer_Name = backend.leaderboard("Customer_Name"),
+        City = Leaderboard(geo_index.year_city_totals(), "City"))
+
+
+def query_leaderboards(leaderboards, years):
+
+    """ runs every top-K query of the General and year pages, so SQL leaderboards stored in a
+    snapshot bundle carry their results """
+
+    for board in leaderboards.values():
+        for year in [None] + list(years):
+            board.top(TOP_K, TOP_METRIC, year)
+
+
+
+# ________________________________________________ PIE - PLOT ______________________________________________________
+#pie_fig = px.pie(data, values="Sales", names="Product Sub-Category", 
+#            title="Sales by product category for the 4-year period", color_discrete_sequence=px.colors.sequential.Brwnyl)
+
+
+# ______________________________ PERCENT - CHANGE ----------------
+# Frequencies the pages show; period_tables also builds quarterly and monthly tables when asked
+PERIOD_FREQS = ['Y']
+
+# Totals of every metric per period with their change from the previous period, from one grouped pass
+# over the cube, and the distinct customers per period from the backend
+@registry.artifact
+def periods(cube, backend):
+    return period_tables(cube, freqs=PERIOD_FREQS,
+                         customers={freq: backend.distinct_customers(freq) for freq in PERIOD_FREQS})
+
+
+
+# _______________________________________________________________________ PER YEAR DATA ____________________________________________________
+# The available years are discovered from the data
+@registry.artifact
+def years(backend):
+    return backend.years()
+
+
+# Bitmap and date indexes of the order table for the explorer's ad-hoc filters, or their SQL equivalent
+@registry.artifact
+def filter_index(backend):
+    return backend.filter_index()
+
+
+
+# _______________________________________________________________________ PAGE FIGURES ____________________________________________________
+class PageFigures:
+
+    """ figures the pages draw for the selected year and performance indicator, each drawn on first
+    use. Given a cache, every figure is an entry of its own for the dataset version, sized by its JSON
+    and evicted on its own; a snapshot bundle serves them without cube, months_df or cache.
+
+    With stamps, {year: stamp} from the backend, the figures of a year are cached under its stamp
+    instead; the stored aggregates give each year a stamp of its own, so a new version of the
+    aggregates reuses the figures of the years its appended batches did not touch """
+
+    def __init__(self, cube=None, months_df=None, figures=None, version=None, cache=None, stamps=None):
+        self.cube = cube
+        self.months_df = months_df
+        self.version = version
+        self.cache = cache
+        self.stamps = stamps or {}
+        self.figures = dict(figures or {})
+        self.drawn = list(self.figures)
+        self.lock = threading.Lock()
+
+    def _get(self, key, make):
+        with self.lock:
+            if key not in self.drawn:
+                self.drawn.append(key)
+
+        if self.cache is not None:
+            # The year is the last part of every key, None for the figures over all years
+            scope = self.stamps.get(key[-1], self.version)
+            return self.cache.get(("figure", key[0], scope) + key[1:], make)
+
+        with self.lock:
+            if key in self.figures:
+                return self.figures[key]
+
+        fig = make()
+        with self.lock:
+            return self.figures.setdefault(key, fig)
+
+    def figure(self, key):
+
+        """ returns the figure or figures of a key of drawn """
+
+        if key[0] == "category":
+            return self.category_figs(*key[1:])
+        return self.month_fig(*key[1:])
+
+    def category_figs(self, indicator, year=None):
+
+        """ returns the figure of every category in CATEGORIES: stacked bars per year over all
+        years, or the pies of one year """
+
+        metric, histogram_colors, pie_colors = INDICATORS[indicator]
+
+        def make():
+            if year is None:
+                return [category_histogram(self.cube, cat, metric, histogram_colors) for cat in CATEGORIES]
+            year_cube = year_slice(self.cube, year)
+            return [category_pie(year_cube, cat, metric, pie_colors) for cat in CATEGORIES]
+
+        return self._get(("category", indicator, year), make)
+
+    def month_fig(self, year):
+
+        """ returns the monthly sales of year """
+
+        def make():
+            data_y = self.months_df[self.months_df.index.year == year]
+            fig = px.line(data_y, x=data_y.index.month, markers=True, y=data_y['Sales'])
+            fig.update_layout( title='Monthly sales over the year', hovermode='x unified', xaxis = dict(
+                            tickmode = 'array',
+                            tickvals = np.arange(1,13),
+                            ticktext = ['January', 'February', 'March', 'April', 'May', 'June', 'July','August',
+                                                'September', 'October', 'November', 'December']
+                                    ))
+            return fig
+
+        return self._get(("month", year), make)
+
+    def draw_all(self, years):
+
+        """ draws every figure of the General and year pages """
+
+        for indicator in INDICATORS:
+            for year in [None] + list(years):
+                self.category_figs(indicator, year)
+
+        for year in years:
+            self.month_fig(year)
+
+
+# Figures of a year the appends to the stored aggregates did not touch carry over from the previous version
+@registry.artifact
+def figures(version, cube, months_df, backend):
+    return PageFigures(cube, months_df, version=version, cache=registry.cache, stamps=backend.year_stamps())
+
+
+# Per-segment forecasts written by the nightly batch (python batch_forecast.py), or None
+@registry.artifact(memoize=False)
+def segment_forecasts():
+    return load_segment_forecasts()
@@ -0,0 +1,420 @@
+""" Storage backends of the dashboard.
+
+The artifacts read the orders through a backend: PandasBackend over the order table loaded in
+memory, AggregatesBackend over the aggregates streamed from it (see aggregates.py), or a SQL
+backend over an embedded engine that runs every group-by, distinct count, top-K and filter as a
+SQL aggregate so only small results come back to Python:
+
+    python backends.py Sample_Superstore.csv orders.parquet     # or orders.db for SQLite
+    SUPERSTORE_BACKEND=duckdb:orders.parquet streamlit run superstore.py
+    SUPERSTORE_BACKEND=sqlite:orders.db streamlit run superstore.py
+"""
+import abc
+import argparse
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+from cube import CALENDAR_ORDER, KEYS, METRICS, build_cube, calendar_sort, month_end_index
+from filters import FILTER_DIMS, FilterIndex
+from geo import GeoIndex
+from ingest import CATEGORICAL_COLS, dataset_version, read_chunks
+from partitions import order_years
+from periods import distinct_customers
+from topk import Leaderboard
+
+
+# Columns of the preprocessed order table, the only names interpolated into SQL
+COLUMNS = set(CATEGORICAL_COLS + KEYS + METRICS + ['Order_Date', 'Ship_Date', 'Postal_Code'])
+
+TABLE = "orders"
+
+# Backends opened, keyed on their URL
+_backends = {}
+_lock = threading.Lock()
+
+
+
+# ______________________________________________ HELPER FUNCTIONS __________________________________________________________
+def column(name):
+
+    """ returns name if it is a column of the order table, so it can be used in a SQL statement """
+
+    if name not in COLUMNS:
+        raise ValueError("unknown column " + repr(name))
+    return name
+
+
+def metric_sums(metrics=METRICS):
+    return ", ".join("SUM({0}) AS {0}".format(column(metric)) for metric in metrics)
+
+
+
+# ____________________________________________ PANDAS BACKEND ___________________________________________________________________
+class PandasBackend:
+
+    """ the order table loaded in memory, indexed by Order_Date, of the dataset version given """
+
+    def __init__(self, data, version=None):
+        self.data = data
+        self.version = version
+
+    def cube(self):
+        return build_cube(self.data)
+
+    def distinct_counts(self):
+        return dict(products=self.data["Product_ID"].nunique(), customers=self.data["Customer_ID"].nunique())
+
+    def distinct_customers(self, freq='Y'):
+        return distinct_customers(self.data, freq)
+
+    def years(self):
+        return order_years(self.data.index)
+
+    def geo_index(self):
+        return GeoIndex(self.data)
+
+    def leaderboard(self, entity):
+        return Leaderboard.from_rows(self.data, entity)
+
+    def filter_index(self):
+        return FilterIndex(self.data)
+
+    def year_stamps(self):
+
+        """ returns {year: dataset version}; a new version of the order table redraws every year """
+
+        return dict.fromkeys(self.years(), self.version)
+
+
+
+# ____________________________________________ AGGREGATES BACKEND _______________________________________________________________
+class AggregatesBackend:
+
+    """ the RunningAggregates of an order file, without its rows; the explorer, which filters the
+    rows, is not available """
+
+    def __init__(self, aggregates):
+        self.aggregates = aggregates
+
+    def cube(self):
+        return self.aggregates.cube
+
+    def distinct_counts(self):
+        return dict(products=len(self.aggregates.products), customers=len(self.aggregates.customers))
+
+    def distinct_customers(self, freq='Y'):
+        if freq != 'Y':
+            raise ValueError("the aggregates count distinct customers per year only")
+
+        years = sorted(self.aggregates.customers_per_year)
+        return pd.Series([self.aggregates.unique_customers(year) for year in years], index=years)
+
+    def years(self):
+        return sorted(self.aggregates.customers_per_year)
+
+    def geo_index(self):
+        # The index adds its state codes to the table it is given
+        return GeoIndex.from_table(self.aggregates.geo.copy())
+
+    def leaderboard(self, entity):
+        return self.aggregates.leaderboards[entity]
+
+    def year_stamps(self):
+
+        """ returns {year: stamp}; the stamp changes only when an appended batch touches the year """
+
+        return self.aggregates.year_stamps()
+
+
+
+# ____________________________________________ SQL BACKENDS _____________________________________________________________________
+class SQLBackend(abc.ABC):
+
+    """ the order table in an embedded SQL engine; every method sends one aggregate query.
+
+    Subclasses connect to the engine and run a query with `?` parameters into a DataFrame. The lease
+    and stats methods mirror SharedDataset, so the app serves a backend the way it serves the shared
+    dataset; the dataset version is the fingerprint of the database or Parquet file. """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.queries = 0
+
+    @abc.abstractmethod
+    def execute(self, sql, params):
+
+        """ returns the rows of sql run with the `?` params as a DataFrame """
+
+    def date_param(self, timestamp):
+        return timestamp.to_pydatetime()
+
+    def query(self, sql, params=()):
+        with self.lock:
+            self.queries += 1
+            return self.execute(sql.format(table=TABLE), list(params))
+
+    @contextmanager
+    def lease(self):
+        yield dataset_version(self.path)
+
+    def stats(self):
+        with self.lock:
+            return dict(queries=self.queries)
+
+    def cube(self):
+        keys = ", ".join(KEYS)
+        cube = self.query("SELECT {keys}, {sums}, COUNT(*) AS Count FROM {{table}} GROUP BY {keys}".format(
+            keys=keys, sums=metric_sums()))
+        return cube.astype(dict(Order_Year='int64', Sales='float64', Quantity='int64', Discount='float64',
+                                Profit='float64', Count='int64'))
+
+    def distinct_counts(self):
+        counts = self.query("SELECT COUNT(DISTINCT Product_ID) AS products, COUNT(DISTINCT Customer_ID) AS customers "
+                            "FROM {table}")
+        return {key: int(value) for key, value in counts.iloc[0].items()}
+
+    def distinct_customers(self, freq='Y'):
+
+        """ returns the distinct customers per year, the only frequency the pages show (see
+        artifacts.PERIOD_FREQS); other frequencies are not pushed down and raise a ValueError """
+
+        if freq != 'Y':
+            raise ValueError("distinct customers are pushed down per year only")
+
+        customers = self.query("SELECT Order_Year, COUNT(DISTINCT Customer_ID) AS Customers FROM {table} "
+                               "GROUP BY Order_Year ORDER BY Order_Year")
+        return customers.set_index(customers['Order_Year'].astype(int))['Customers']
+
+    def years(self):
+        years = self.query("SELECT DISTINCT Order_Year FROM {table} ORDER BY Order_Year")
+        return [int(year) for year in years['Order_Year']]
+
+    def geo_index(self):
+        return GeoIndex.from_table(self.query(
+            "SELECT Order_Year, State, City, {} FROM {{table}} GROUP BY Order_Year, State, City".format(metric_sums())))
+
+    def leaderboard(self, entity):
+        return SQLLeaderboard(self, entity)
+
+    def filter_index(self):
+        return SQLFilterIndex(self)
+
+    def year_stamps(self):
+
+        """ returns {year: dataset version}; a new version of the file redraws every year """
+
+        return dict.fromkeys(self.years(), dataset_version(self.path))
+
+
+class DuckDBBackend(SQLBackend):
+
+    """ DuckDB over a Parquet file, or over the orders table of a DuckDB database file """
+
+    def __init__(self, path):
+        super().__init__(path)
+
+        # Imported here so the dashboard runs without duckdb unless this backend is chosen
+        import duckdb
+
+        if path.endswith(".parquet"):
+            self.connection = duckdb.connect()
+            self.connection.execute("CREATE VIEW {} AS SELECT * FROM read_parquet('{}')".format(
+                TABLE, path.replace("'", "''")))
+        else:
+            self.connection = duckdb.connect(path, read_only=True)
+
+    def execute(self, sql, params):
+        return self.connection.execute(sql, params).df()
+
+
+class SQLiteBackend(SQLBackend):
+
+    """ SQLite over the orders table of a database file; dates are stored as ISO text """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.connection = sqlite3.connect("file:{}?mode=ro".format(path), uri=True, check_same_thread=False)
+
+    def execute(self, sql, params):
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def date_param(self, timestamp):
+        return timestamp.strftime("%Y-%m-%d %H:%M:%S")
+
+
+BACKENDS = {'duckdb': DuckDBBackend, 'sqlite': SQLiteBackend}
+
+
+def open_backend(url):
+
+    """ returns the process-wide backend of url, "<engine>:<path>" with engine a key of BACKENDS """
+
+    engine, _, path = url.partition(":")
+    if engine not in BACKENDS or not path:
+        raise ValueError("backend URL must look like duckdb:orders.parquet or sqlite:orders.db, got " + repr(url))
+
+    with _lock:
+        if url not in _backends:
+            _backends[url] = BACKENDS[engine](path)
+        return _backends[url]
+
+
+
+# ____________________________________________ PUSHED-DOWN QUERIES ______________________________________________________________
+class SQLLeaderboard:
+
+    """ Leaderboard answering each top-K query with an ORDER BY ... LIMIT aggregate.
+
+    Pickled, e.g. into a snapshot bundle, it keeps the results of the queries it has answered and
+    leaves out the backend with its connection """
+
+    def __init__(self, backend, entity):
+        self.backend = backend
+        self.entity = column(entity)
+        self.results = {}
+
+    def __getstate__(self):
+        return dict(self.__dict__, backend=None)
+
+    def top(self, k=10, metric="Quantity", year=None):
+
+        """ returns the k entities with the largest metric, in ascending order for horizontal bars """
+
+        key = (k, metric, year)
+        if key not in self.results:
+            if self.backend is None:
+                raise KeyError("top {} by {} for year {} was not queried before the leaderboard was stored".format(
+                    k, metric, year))
+            where, params = ("WHERE Order_Year = ?", [int(year)]) if year is not None else ("", [])
+            top = self.backend.query(
+                "SELECT {entity}, {sums} FROM {{table}} {where} GROUP BY {entity} ORDER BY {metric} DESC, {entity} "
+                "LIMIT ?".format(entity=self.entity, sums=metric_sums(), where=where, metric=column(metric)),
+                params + [int(k)])
+            self.results[key] = top.iloc[::-1].reset_index(drop=True)
+
+        return self.results[key]
+
+
+class SQLFilterIndex:
+
+    """ FilterIndex whose selections are WHERE clauses run by the engine """
+
+    def __init__(self, backend, dims=FILTER_DIMS):
+        self.backend = backend
+        self.dims = {dim: [value for value in backend.query(
+                        "SELECT DISTINCT {0} FROM {{table}} ORDER BY {0}".format(column(dim)))[dim]] for dim in dims}
+        bounds = backend.query("SELECT MIN(Order_Date) AS first, MAX(Order_Date) AS last FROM {table}")
+        self.first_date, self.last_date = pd.Timestamp(bounds['first'][0]), pd.Timestamp(bounds['last'][0])
+
+    def values(self, dim):
+        return list(self.dims[dim])
+
+    def date_range(self):
+        return self.first_date, self.last_date
+
+    def select(self, start=None, end=None, **chosen):
+
+        """ returns the selection as (WHERE clause, parameters), see FilterIndex.select """
+
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("Order_Date >= ?")
+            params.append(self.backend.date_param(pd.Timestamp(start)))
+        if end is not None:
+            clauses.append("Order_Date < ?")
+            params.append(self.backend.date_param(pd.Timestamp(end) + pd.Timedelta(days=1)))
+
+        for dim, values in chosen.items():
+            if values:
+                clauses.append("{} IN ({})".format(column(dim), ", ".join("?" * len(values))))
+                params.extend(values)
+
+        return ("WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count(self, selection):
+        where, params = selection
+        return int(self.backend.query("SELECT COUNT(*) AS n FROM {{table}} {}".format(where), params)['n'][0])
+
+    def key_indicators(self, selection):
+        where, params = selection
+        row = self.backend.query(
+            "SELECT COUNT(DISTINCT Product_ID) AS products, COUNT(DISTINCT Customer_ID) AS customers, {} "
+            "FROM {{table}} {}".format(metric_sums(), where), params).fillna(0).iloc[0]
+        return dict(
+            unique_products = int(row["products"]),
+            unique_customers = int(row["customers"]),
+            total_sales = row["Sales"],
+            total_products_sold = row["Quantity"],
+            total_discounts = row["Discount"],
+            net_profit = row["Profit"])
+
+    def monthly_totals(self, selection, metric="Sales"):
+        where, params = selection
+        months = self.backend.query("SELECT Order_Year, Order_Month, SUM({0}) AS {0} FROM {{table}} {1} "
+                                    "GROUP BY Order_Year, Order_Month".format(column(metric), where), params)
+        if len(months) == 0:
+            return pd.DataFrame({metric: []}, index=pd.DatetimeIndex([]))
+
+        months.index = month_end_index(months)
+        months = months[[metric]].sort_index()
+        full_range = pd.date_range(months.index.min(), months.index.max(), freq='M')
+        return months.reindex(full_range, fill_value=0)
+
+    def category_totals(self, selection, cat, metric="Sales"):
+        where, params = selection
+        totals = self.backend.query("SELECT {0}, SUM({1}) AS {1} FROM {{table}} {2} GROUP BY {0} ORDER BY {0}".format(
+            column(cat), column(metric), where), params)
+        return calendar_sort(totals) if cat in CALENDAR_ORDER else totals
+
+
+
+# ____________________________________________ EXPORT _____________________________________________________________________________
+def export_orders(csv_path, out_path):
+
+    """ writes the preprocessed orders of csv_path, one chunk at a time, to a Parquet file (for
+    DuckDB) or, for any other extension, to the orders table of a SQLite database """
+
+    if os.path.exists(out_path):
+        os.remove(out_path)
+
+    if out_path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        for chunk in read_chunks(csv_path):
+            # Plain strings, since every chunk has its own categories; Parquet dictionary-encodes them again
+            table = pa.Table.from_pandas(chunk.astype({col: str for col in chunk.select_dtypes('category')}),
+                                         preserve_index=False)
+            writer = writer or pq.ParquetWriter(out_path, table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+        return
+
+    with sqlite3.connect(out_path) as connection:
+        for chunk in read_chunks(csv_path):
+            chunk = chunk.astype({col: str for col in chunk.select_dtypes('category')})
+            chunk.to_sql(TABLE, connection, if_exists='append', index=False)
+        connection.execute("CREATE INDEX orders_date ON {}(Order_Date)".format(TABLE))
+        connection.execute("CREATE INDEX orders_year ON {}(Order_Year)".format(TABLE))
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the order file for a SQL backend.")
+    parser.add_argument("csv", help="order file")
+    parser.add_argument("out", help="Parquet file for duckdb, or SQLite database file")
+    args = parser.parse_args(argv)
+
+    export_orders(args.csv, args.out)
+    print("wrote " + args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+""" Rolling-origin backtesting and model selection of the sales forecasts.
+
+Fits every candidate SARIMAX model of a grid on several training windows of the dashboard's monthly
+sales (and, with --segments, of every series of those segment types) across a process pool, scores
+the forecasts of the following months, and selects per target the model the dashboard and the
+segment batch then use:
+
+    python backtest.py --workers 8
+    python backtest.py --segments State Sub_Category --folds 6 --timeout 60
+"""
+import argparse
+import ast
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from batch_forecast import MIN_MONTHS, SEGMENTS, FitTimeout, fit_timeout, segment_series
+from cube import build_cube, monthly_series
+from forecast import FORECAST_DIR, HORIZON, ORDER, SEASONAL_ORDER, fit, predict, selection_path, series_hash
+from ingest import load_orders
+
+
+# Candidate models: every combination of these non-seasonal and seasonal orders
+ORDERS = [(0, 1, 1), (1, 1, 0), (1, 1, 1), (2, 1, 0), (2, 1, 1)]
+SEASONAL_ORDERS = [(0, 0, 0, 12), (1, 0, 0, 12), (0, 1, 1, 12), (1, 1, 0, 12)]
+CANDIDATES = list(itertools.product(ORDERS, SEASONAL_ORDERS))
+
+# Training windows per series: the last ends HORIZON months before the end of the series, and each
+# earlier one STEP months before the next
+FOLDS = 4
+STEP = 3
+
+# Error the selection compares candidates on; sMAPE is scale-free, so segment series of different
+# sizes weigh the same
+METRIC = "sMAPE"
+
+# Candidates whose error is within this fraction of the best one count as equally accurate, and the
+# one among them with the least CPU time per fit is selected
+TOLERANCE = 0.05
+
+BACKTEST_DIR = os.path.join(FORECAST_DIR, "backtest")
+RESULTS_FILE = os.path.join(FORECAST_DIR, "backtest.parquet")
+
+
+
+# ______________________________________________ HELPER FUNCTIONS __________________________________________________________
+def fold_origins(n_months, folds=FOLDS, step=STEP, horizon=HORIZON, min_train=MIN_MONTHS):
+
+    """ returns the training lengths of the folds of a series of n_months, oldest first """
+
+    origins = [n_months - horizon - step * i for i in range(folds)]
+    return sorted(origin for origin in origins if origin >= min_train)
+
+
+def errors(actual, predicted):
+
+    """ returns the MAE, RMSE and sMAPE (in %) of predicted against actual """
+
+    actual, predicted = np.asarray(actual, dtype=float), np.asarray(predicted, dtype=float)
+    diff = predicted - actual
+    scale = np.abs(actual) + np.abs(predicted)
+    smape = np.where(scale > 0, 2 * np.abs(diff) / np.where(scale > 0, scale, 1), 0).mean() * 100
+    return dict(MAE=np.abs(diff).mean(), RMSE=np.sqrt((diff ** 2).mean()), sMAPE=smape)
+
+
+def fold_path(key, backtest_dir=BACKTEST_DIR):
+    return os.path.join(backtest_dir, key + ".pkl")
+
+
+
+# ______________________________________________ FOLDS _____________________________________________________________________
+def evaluate_fold(target, name, series, origin, order, seasonal_order, horizon=HORIZON, timeout=None,
+                  backtest_dir=BACKTEST_DIR):
+
+    """ fits the candidate on the first origin months of series in a worker process and returns the
+    errors of its forecast of the next horizon months; a fold already fitted is read from backtest_dir """
+
+    train, test = series.iloc[:origin], series.iloc[origin:origin + horizon]
+    row = dict(Target=target, Series=name, Order=str(tuple(order)), Seasonal_Order=str(tuple(seasonal_order)),
+               Origin=train.index[-1], Status="ok", CPU_Seconds=np.nan, Cached=False)
+
+    key = "{}-{}".format(series_hash(train, order, seasonal_order), len(test))
+    path = fold_path(key, backtest_dir)
+
+    if os.path.exists(path):
+        fold = pd.read_pickle(path)
+        row["Cached"] = True
+    else:
+        start = time.process_time()
+        try:
+            with fit_timeout(timeout):
+                results = fit(train, order, seasonal_order)
+                predictions = predict(results, train, len(test))['predicted_mean'].to_numpy()
+        except FitTimeout:
+            row["Status"] = "timeout"
+            return row
+        except Exception:
+            row["Status"] = "error"
+            return row
+
+        fold = dict(predictions=predictions, cpu_seconds=time.process_time() - start)
+        os.makedirs(backtest_dir, exist_ok=True)
+        tmp_path = path + ".tmp.{}".format(os.getpid())
+        pd.to_pickle(fold, tmp_path)
+        os.replace(tmp_path, path)
+
+    row["CPU_Seconds"] = fold["cpu_seconds"]
+    row.update(errors(test.to_numpy(), fold["predictions"]))
+    return row
+
+
+def target_series(cube, segment_types=()):
+
+    """ yields (target, name, monthly sales series): the dashboard's series under the target "Sales",
+    then every series of each segment type under the segment type """
+
+    yield "Sales", "Sales", monthly_series(cube, "Sales")["Sales"]
+
+    for segment_type, segment, series in segment_series(cube, segment_types):
+        if (series != 0).sum() >= MIN_MONTHS:
+            yield segment_type, segment, series
+
+
+
+# ______________________________________________ BACKTEST ENGINE ___________________________________________________________
+def run_backtest(series, candidates=CANDIDATES, folds=FOLDS, workers=None, timeout=None, backtest_dir=BACKTEST_DIR):
+
+    """ evaluates every candidate on every fold of every (target, name, series) in parallel and
+    returns one row per fold with its errors, CPU seconds and status """
+
+    rows = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(evaluate_fold, target, name, values, origin, order, seasonal_order,
+                                   timeout=timeout, backtest_dir=backtest_dir)
+                   for target, name, values in series
+                   for origin in fold_origins(len(values), folds)
+                   for order, seasonal_order in candidates]
+
+        for future in as_completed(futures):
+            rows.append(future.result())
+
+    return pd.DataFrame(rows).sort_values(['Target', 'Series', 'Order', 'Seasonal_Order', 'Origin'], ignore_index=True)
+
+
+def summarize(results):
+
+    """ returns one row per (target, candidate) with its mean errors, mean CPU seconds per fit and
+    the share of its folds that failed """
+
+    results = results.assign(Failed=results['Status'] != "ok")
+    summary = results.groupby(['Target', 'Order', 'Seasonal_Order']).agg(
+                    MAE=("MAE", "mean"),
+                    RMSE=("RMSE", "mean"),
+                    sMAPE=("sMAPE", "mean"),
+                    CPU_Seconds=("CPU_Seconds", "mean"),
+                    Folds=("Status", "size"),
+                    Failed=("Failed", "mean")).reset_index()
+
+    return summary.sort_values(['Target', METRIC], ignore_index=True)
+
+
+def select_models(summary, metric=METRIC, tolerance=TOLERANCE):
+
+    """ returns {target: model} with the candidate of every target that fits fastest among those
+    within tolerance of the lowest error, leaving out candidates with failed folds """
+
+    selection = {}
+    for target, candidates in summary[summary['Failed'] == 0].groupby('Target'):
+        best = candidates[metric].min()
+        accurate = candidates[candidates[metric] <= best * (1 + tolerance)]
+        chosen = accurate.sort_values(['CPU_Seconds', metric]).iloc[0]
+        selection[target] = dict(order=list(ast.literal_eval(chosen['Order'])),
+                                 seasonal_order=list(ast.literal_eval(chosen['Seasonal_Order'])),
+                                 metric=metric, error=float(chosen[metric]), best_error=float(best),
+                                 cpu_seconds=float(chosen['CPU_Seconds']), folds=int(chosen['Folds']),
+                                 selected=time.time())
+
+    return selection
+
+
+def save_backtest(results, selection, results_file=RESULTS_FILE, forecast_dir=FORECAST_DIR):
+
+    """ stores the fold results and merges the selection into the models the forecasts use """
+
+    os.makedirs(forecast_dir, exist_ok=True)
+    results.to_parquet(results_file, index=False)
+
+    path = selection_path(forecast_dir)
+    stored = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            stored = json.load(f)
+    stored.update(selection)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(stored, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the candidate forecast models and select one per target.")
+    parser.add_argument("--data", default="Sample_Superstore.csv", help="order file")
+    parser.add_argument("--segments", nargs="+", choices=list(SEGMENTS), default=[],
+                        help="also select a model for the series of these segment types")
+    parser.add_argument("--folds", type=int, default=FOLDS, help="training windows per series")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds allowed per fit")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="error margin within which the fastest candidate is selected")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    cube = build_cube(load_orders(args.data))
+    results = run_backtest(list(target_series(cube, args.segments)), folds=args.folds, workers=args.workers,
+                           timeout=args.timeout)
+    summary = summarize(results)
+    selection = select_models(summary, tolerance=args.tolerance)
+    save_backtest(results, selection)
+
+    print("{} folds ({} cached) in {:.1f}s".format(len(results), int(results['Cached'].sum()), time.perf_counter() - start))
+    for target, candidates in summary.groupby('Target'):
+        print("\n" + target)
+        print(candidates.drop(columns='Target').head(10).to_string(index=False))
+        model = selection.get(target)
+        if model is None:
+            print("no candidate without failed folds, keeping {}".format((ORDER, SEASONAL_ORDER)))
+        else:
+            print("selected {} {}: {} {:.2f} (best {:.2f}), {:.3f} CPU s per fit".format(
+                tuple(model["order"]), tuple(model["seasonal_order"]), model["metric"], model["error"],
+                model["best_error"], model["cpu_seconds"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+""" Batch forecasting of the monthly sales of every dashboard segment.
+
+Fits one model per State, Sub_Category and Region x Category series across a process pool and
+writes the forecasts to a table the dashboard reads with load_segment_forecasts.
+
+    python batch_forecast.py --workers 8 --timeout 120 --auto
+"""
+import argparse
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import pandas as pd
+
+from cube import build_cube, monthly_panel
+from forecast import ORDER, SEASONAL_ORDER, FORECAST_DIR, fit, predict, selected_orders
+from ingest import load_orders
+
+
+# Segment type -> columns whose combinations make up its series
+SEGMENTS = {
+    'State': ['State'],
+    'Sub_Category': ['Sub_Category'],
+    'Region_Category': ['Region', 'Category'],
+}
+
+# Series with fewer months than this are not forecasted
+MIN_MONTHS = 24
+
+SEGMENT_FORECASTS_FILE = os.path.join(FORECAST_DIR, "segments.parquet")
+SEGMENT_STATUS_FILE = os.path.join(FORECAST_DIR, "segments_status.parquet")
+
+
+
+class FitTimeout(Exception):
+    pass
+
+
+
+# ______________________________________________ HELPER FUNCTIONS __________________________________________________________
+def raise_timeout(signum, frame):
+    raise FitTimeout()
+
+
+@contextmanager
+def fit_timeout(seconds):
+
+    """ raises FitTimeout in the block once seconds have passed, without a limit for None or where
+    SIGALRM does not exist; SIGALRM interrupts a fit inside a worker process, which a future's
+    timeout cannot do """
+
+    if seconds is None or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    previous = signal.signal(signal.SIGALRM, raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def select_orders(series):
+
+    """ returns the (order, seasonal_order) chosen for series by pmdarima's auto_arima """
+
+    from pmdarima import auto_arima
+
+    model = auto_arima(series, seasonal=True, m=12, suppress_warnings=True, error_action='ignore')
+    return model.order, model.seasonal_order
+
+
+def fit_segment(segment_type, segment, series, order=ORDER, seasonal_order=SEASONAL_ORDER, auto=False, timeout=None):
+
+    """ fits and forecasts one segment series in a worker process and returns its predictions and status """
+
+    status = dict(Segment_Type=segment_type, Segment=segment, Status="ok", Order=None, Seconds=0.0, Error=None)
+    start = time.perf_counter()
+
+    if (series != 0).sum() < MIN_MONTHS:
+        status["Status"] = "too_short"
+        return None, status
+
+    try:
+        with fit_timeout(timeout):
+            if auto:
+                order, seasonal_order = select_orders(series)
+            results = fit(series, order=order, seasonal_order=seasonal_order)
+            predictions = predict(results, series)
+    except FitTimeout:
+        status["Status"] = "timeout"
+        return None, status
+    except Exception as e:
+        status["Status"] = "error"
+        status["Error"] = str(e)
+        return None, status
+    finally:
+        status["Seconds"] = time.perf_counter() - start
+
+    status["Order"] = str((tuple(order), tuple(seasonal_order)))
+
+    predictions = predictions.rename(columns={'predicted_mean': 'Predicted_Sales'})
+    predictions.index.name = 'Month'
+    predictions = predictions.reset_index()
+    predictions.insert(0, 'Segment', segment)
+    predictions.insert(0, 'Segment_Type', segment_type)
+    return predictions, status
+
+
+def segment_series(cube, segment_types=SEGMENTS):
+
+    """ yields (segment_type, segment, monthly sales series) for every segment """
+
+    for segment_type in segment_types:
+        panel = monthly_panel(cube, SEGMENTS[segment_type], "Sales")
+        for segment in panel.columns:
+            yield segment_type, segment, panel[segment]
+
+
+
+# ______________________________________________ BATCH ENGINE ______________________________________________________________
+def run_batch(cube, segment_types=SEGMENTS, workers=None, timeout=None, auto=False):
+
+    """ forecasts every segment series in parallel, with the orders backtest.py selected for its
+    segment type, and returns (forecasts, status) frames """
+
+    forecasts = []
+    statuses = []
+    orders = {segment_type: selected_orders(segment_type) for segment_type in segment_types}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fit_segment, segment_type, segment, series, *orders[segment_type], auto=auto,
+                                   timeout=timeout)
+                   for segment_type, segment, series in segment_series(cube, segment_types)]
+
+        for future in as_completed(futures):
+            predictions, status = future.result()
+            statuses.append(status)
+            if predictions is not None:
+                forecasts.append(predictions)
+
+    columns = ['Segment_Type', 'Segment', 'Month', 'Predicted_Sales']
+    forecasts = pd.concat(forecasts, ignore_index=True) if forecasts else pd.DataFrame(columns=columns)
+    statuses = pd.DataFrame(statuses).sort_values(['Segment_Type', 'Segment'], ignore_index=True)
+
+    return forecasts.sort_values(['Segment_Type', 'Segment', 'Month'], ignore_index=True), statuses
+
+
+def merge_run(table, path, segment_types):
+
+    """ returns table with the rows stored at path of the segment types this run did not cover """
+
+    if not os.path.exists(path):
+        return table
+
+    stored = pd.read_parquet(path)
+    stored = stored[~stored['Segment_Type'].isin(segment_types)]
+    sort_by = [column for column in ['Segment_Type', 'Segment', 'Month'] if column in table.columns]
+    return pd.concat([stored, table], ignore_index=True).sort_values(sort_by, ignore_index=True)
+
+
+def save_forecasts(forecasts, statuses, segment_types=SEGMENTS, forecasts_file=SEGMENT_FORECASTS_FILE,
+                   status_file=SEGMENT_STATUS_FILE):
+
+    """ stores the forecasts and statuses of a run over segment_types, replacing the stored ones of
+    those segment types and keeping the others """
+
+    os.makedirs(os.path.dirname(forecasts_file), exist_ok=True)
+    merge_run(forecasts, forecasts_file, segment_types).to_parquet(forecasts_file, index=False)
+    merge_run(statuses, status_file, segment_types).to_parquet(status_file, index=False)
+
+
+def load_segment_forecasts(segment_type=None, segment=None, forecasts_file=SEGMENT_FORECASTS_FILE):
+
+    """ returns the stored segment forecasts, optionally filtered, or None if the batch has not run """
+
+    if not os.path.exists(forecasts_file):
+        return None
+
+    filters = []
+    if segment_type is not None:
+        filters.append(('Segment_Type', '==', segment_type))
+    if segment is not None:
+        filters.append(('Segment', '==', segment))
+
+    return pd.read_parquet(forecasts_file, filters=filters or None)
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Forecast the monthly sales of every segment.")
+    parser.add_argument("--data", default="Sample_Superstore.csv", help="order file")
+    parser.add_argument("--segments", nargs="+", choices=list(SEGMENTS), default=list(SEGMENTS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds allowed per series")
+    parser.add_argument("--auto", action="store_true", help="select each series' orders with auto_arima")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    cube = build_cube(load_orders(args.data))
+    forecasts, statuses = run_batch(cube, args.segments, workers=args.workers, timeout=args.timeout, auto=args.auto)
+    save_forecasts(forecasts, statuses, args.segments)
+
+    print("{} series in {:.1f}s".format(len(statuses), time.perf_counter() - start))
+    print(statuses.groupby(['Segment_Type', 'Status']).size().to_string())
+
+
+if __name__ == "__main__":
+    main()
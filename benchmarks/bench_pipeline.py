@@ -0,0 +1,353 @@
+""" Headless benchmarks of the dashboard pipeline.
+
+Runs every pipeline stage without Streamlit on synthetic order files shaped like
+Sample_Superstore.csv and reports wall time and peak memory per stage, after the time a fresh
+interpreter spends on the app's imports.
+
+    python benchmarks/bench_pipeline.py --sizes 10k 1m
+    python benchmarks/bench_pipeline.py --sizes 10k --save-baseline
+    python benchmarks/bench_pipeline.py --sizes 10k --compare
+"""
+import argparse
+import ast
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import psutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backends import BACKENDS, export_orders
+from cube import build_cube, monthly_series
+from filters import FilterIndex
+from forecast import fit
+from geo import GeoIndex
+from ingest import load_orders, preprocess
+from periods import period_tables
+from topk import build_leaderboards
+
+
+SAMPLE_FILE = os.path.join(ROOT, "Sample_Superstore.csv")
+APP_FILE = os.path.join(ROOT, "superstore.py")
+BASELINE_FILE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '2m': 2_000_000, '10m': 10_000_000}
+
+# A stage regresses when it is this much slower or larger than the baseline
+TOLERANCE = 1.5
+
+# Categories of the explorer's charts, as in artifacts.CATEGORIES
+EXPLORER_CHARTS = ["Category", "Sub_Category", "Order_Day", "Order_Month", "Region", "Ship_Mode"]
+
+# Seconds a rerun of the unfiltered explorer may take at any size, once its first render is done
+UNFILTERED_BUDGET = 0.05
+
+# Rows generated and written per block, so the 10m file is never held in memory at once
+BLOCK_ROWS = 500_000
+
+
+
+# ______________________________________________ SYNTHETIC DATA ____________________________________________________________
+def make_dataset(path, n_rows, seed=0):
+
+    """ writes n_rows synthetic orders with the sample's schema to path.
+
+    Rows are drawn from the sample with replacement, with order dates spread uniformly over
+    2014-2017, numbers jittered, and product/customer IDs multiplied so their cardinality grows
+    with the number of rows the way a real order history does """
+
+    sample = pd.read_csv(SAMPLE_FILE, encoding='latin1')
+    rng = np.random.default_rng(seed)
+    scale = max(1, n_rows // len(sample))
+    first_day = pd.Timestamp(2014, 1, 1)
+    n_days = (pd.Timestamp(2017, 12, 31) - first_day).days + 1
+
+    written = 0
+    with open(path, "w", encoding='latin1', newline="") as f:
+        while written < n_rows:
+            size = min(BLOCK_ROWS, n_rows - written)
+            block = sample.iloc[rng.integers(0, len(sample), size)].reset_index(drop=True)
+
+            order_dates = first_day + pd.to_timedelta(rng.integers(0, n_days, size), unit='D')
+            ship_dates = order_dates + pd.to_timedelta(rng.integers(0, 8, size), unit='D')
+            block['Order_Date'] = order_dates.strftime("%m/%d/%Y")
+            block['Ship_Date'] = ship_dates.strftime("%m/%d/%Y")
+
+            suffix = pd.Series(rng.integers(0, scale, size)).astype(str)
+            block['Product_ID'] = block['Product_ID'] + "-" + suffix
+            block['Customer_ID'] = block['Customer_ID'] + "-" + suffix
+            block['Customer_Name'] = block['Customer_Name'] + " " + suffix
+
+            jitter = rng.uniform(0.8, 1.2, size)
+            block['Sales'] = (block['Sales'] * jitter).round(4)
+            block['Profit'] = (block['Profit'] * jitter).round(4)
+            block['Row_ID'] = np.arange(written + 1, written + size + 1)
+
+            block.to_csv(f, index=False, header=(written == 0))
+            written += size
+
+
+
+# ______________________________________________ STAGES ____________________________________________________________________
+class PeakMemory:
+
+    """ samples the process' resident memory in a background thread and keeps the peak above the
+    starting point; unlike tracemalloc it does not slow down the code being measured """
+
+    def __init__(self, interval=0.005):
+        self.process = psutil.Process()
+        self.interval = interval
+        self.peak = 0
+        self.running = False
+
+    def _sample(self):
+        while self.running:
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.start = self.peak = self.process.memory_info().rss
+        self.running = True
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+    @property
+    def used(self):
+        return self.peak - self.start
+
+
+def measure(func):
+
+    """ returns (result, seconds, peak bytes of resident memory added while running func) """
+
+    gc.collect()
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+
+    return result, seconds, memory.used
+
+
+def run_stages(csv_path, cache_dir, forecast=True, backends=()):
+
+    """ runs the pipeline on csv_path and returns {stage: {"seconds", "peak_mb"}}; the queries of
+    every SQL backend in backends are timed after the pandas stages """
+
+    results = {}
+
+    def stage(name, func):
+        value, seconds, peak = measure(func)
+        results[name] = dict(seconds=round(seconds, 4), peak_mb=round(peak / 2**20, 2))
+        return value
+
+    raw = stage("read_csv", lambda: pd.read_csv(csv_path, encoding='latin1'))
+    stage("preprocess", lambda: preprocess(raw))
+    del raw
+
+    stage("ingest_cold", lambda: load_orders(csv_path, cache_dir))
+    data = stage("ingest_cached", lambda: load_orders(csv_path, cache_dir)).set_index('Order_Date')
+
+    cube = stage("cube", lambda: build_cube(data))
+    stage("kpis", lambda: (data["Product_ID"].nunique(), data["Customer_ID"].nunique(),
+                           cube[["Sales", "Quantity", "Discount", "Profit"]].sum()))
+    months_df = stage("monthly_resample", lambda: monthly_series(cube, "Sales"))
+
+    if forecast:
+        stage("sarimax_fit", lambda: fit(months_df))
+
+    stage("geo", lambda: GeoIndex(data).state_totals("Sales"))
+    stage("pct_change", lambda: period_tables(cube, data, customer_freqs=['Y']))
+
+    leaderboards = stage("top10_build", lambda: build_leaderboards(data))
+    stage("top10_query", lambda: [board.top(10, "Quantity", year)
+                                  for board in leaderboards.values() for year in [None] + sorted(data['Order_Year'].unique())])
+
+    index = stage("filter_build", lambda: FilterIndex(data))
+    stage("filter_query", lambda: filter_query(index))
+    stage("filter_first_all", lambda: unfiltered_query(index))
+    stage("filter_unfiltered", lambda: unfiltered_query(index))
+
+    for engine in backends:
+        db_path = os.path.join(cache_dir, "orders." + ("parquet" if engine == "duckdb" else "db"))
+        stage(engine + "_export", lambda: export_orders(csv_path, db_path))
+        backend = BACKENDS[engine](db_path)
+        stage(engine + "_cube", backend.cube)
+        stage(engine + "_kpis", lambda: (backend.distinct_counts(), backend.distinct_customers('Y')))
+        stage(engine + "_top10", lambda: backend.leaderboard("Product_ID").top(10, "Quantity"))
+        stage(engine + "_filter", lambda: filter_query(backend.filter_index()))
+        stage(engine + "_unfiltered", lambda: unfiltered_query(backend.filter_index()))
+
+    return results
+
+
+def filter_query(index):
+
+    """ runs one explorer interaction: a date range and three filtered dimensions, then the KPIs,
+    the monthly series and one category chart over the selection """
+
+    positions = index.select("2015-03-10", "2016-11-02", Region=["West", "East"], Segment=["Consumer"],
+                             Ship_Mode=["Standard Class", "Second Class"])
+    return (index.key_indicators(positions), index.monthly_totals(positions, "Sales"),
+            index.category_totals(positions, "Sub_Category", "Sales"))
+
+
+def unfiltered_query(index):
+
+    """ runs the explorer as it first opens: every order date and no dimension filtered, then the
+    KPIs, the monthly series and all its category charts """
+
+    selection = index.select(*index.date_range())
+    return (index.key_indicators(selection), index.monthly_totals(selection, "Sales"),
+            [index.category_totals(selection, cat, "Sales") for cat in EXPLORER_CHARTS])
+
+
+
+# ______________________________________________ STARTUP ___________________________________________________________________
+def app_imports(path=APP_FILE):
+
+    """ returns the import statements at the top level of the app script, which a fresh server
+    runs before it can render anything """
+
+    with open(path) as f:
+        source = f.read()
+
+    return [ast.get_source_segment(source, node) for node in ast.parse(source).body
+            if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def measure_imports(statements, top=10):
+
+    """ runs statements in a fresh interpreter and returns ({"seconds", "peak_mb"}, modules), where
+    modules lists the top packages by import time, summed over their modules, as (name, seconds) """
+
+    code = "\n".join(["import time, psutil", "process = psutil.Process()", "rss = process.memory_info().rss",
+                      "start = time.perf_counter()"] + statements +
+                     ["print(time.perf_counter() - start, process.memory_info().rss - rss)"])
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                               capture_output=True, text=True, check=True)
+    seconds, rss = completed.stdout.split()[-2:]
+
+    # -X importtime writes "import time: self [us] | cumulative | name", indented by nesting level
+    packages = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        if own.strip().isdigit() and package != "psutil":
+            packages[package] = packages.get(package, 0) + int(own) / 1e6
+
+    modules = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return dict(seconds=round(float(seconds), 4), peak_mb=round(int(rss) / 2**20, 2)), modules
+
+
+
+# ______________________________________________ BASELINE __________________________________________________________________
+def compare(results, baseline, tolerance=TOLERANCE):
+
+    """ returns a line per stage that is slower or uses more memory than tolerance x baseline """
+
+    regressions = []
+    for size, stages in results.items():
+        for name, current in stages.items():
+            previous = baseline.get(size, {}).get(name)
+            if previous is None:
+                continue
+            for key in ("seconds", "peak_mb"):
+                # Differences below these floors are timer and allocator noise
+                floor = 0.05 if key == "seconds" else 1.0
+                if current[key] > max(previous[key] * tolerance, previous[key] + floor):
+                    regressions.append("{} {} {}: {} -> {}".format(size, name, key, previous[key], current[key]))
+
+    return regressions
+
+
+def over_budget(results, budget=UNFILTERED_BUDGET):
+
+    """ returns a line per size whose unfiltered explorer rerun took longer than budget """
+
+    lines = []
+    for size, stages in results.items():
+        seconds = stages.get("filter_unfiltered", {}).get("seconds", 0)
+        if seconds > budget:
+            lines.append("{} filter_unfiltered seconds: {} over the budget of {}".format(size, seconds, budget))
+
+    return lines
+
+
+def print_table(size, stages):
+    print("\n{} rows".format(size))
+    print("{:<18}{:>12}{:>12}".format("stage", "seconds", "peak MB"))
+    for name, values in stages.items():
+        print("{:<18}{:>12.4f}{:>12.2f}".format(name, values["seconds"], values["peak_mb"]))
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard pipeline without a browser.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=['10k'])
+    parser.add_argument("--no-forecast", action="store_true", help="skip the SARIMAX fit")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=[], help="also time the SQL backends")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="exit with status 1 on regressions against the baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    args = parser.parse_args(argv)
+
+    imports, modules = measure_imports(app_imports())
+    results = {"startup": {"app_imports": imports}}
+    print("\nstartup: {seconds:.2f}s and {peak_mb:.1f} MB importing the app's modules".format(**imports))
+    for name, seconds in modules:
+        print("{:<30}{:>8.3f}".format(name, seconds))
+
+    workdir = tempfile.mkdtemp(prefix="superstore-bench-")
+    try:
+        for size in args.sizes:
+            csv_path = os.path.join(workdir, "orders_{}.csv".format(size))
+            make_dataset(csv_path, SIZES[size])
+            results[size] = run_stages(csv_path, os.path.join(workdir, "cache"), forecast=not args.no_forecast,
+                                   backends=args.backends)
+            print_table(size, results[size])
+            os.remove(csv_path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print("\nbaseline saved to " + args.baseline)
+
+    if args.compare:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)) + over_budget(results)
+        if regressions:
+            print("\nregressions:\n" + "\n".join(regressions))
+            return 1
+        print("\nno regressions against " + args.baseline)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import pickle
+import sys
+import threading
+
+import pandas as pd
+from cachetools import TTLCache
+from plotly.basedatatypes import BaseFigure
+
+
+# Memory cap of the process-wide cache, entries are evicted least-recently-used first
+MAX_BYTES = 512 * 1024 * 1024
+
+# Seconds an entry stays valid after it is stored
+TTL = 6 * 60 * 60
+
+
+
+# ______________________________________________ HELPER FUNCTIONS __________________________________________________________
+def sizeof(value):
+
+    """ returns a cheap estimate of the memory held by value in bytes """
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        # deep=True would walk every string in object columns
+        size = value.memory_usage(index=True, deep=False)
+        return int(size.sum()) if isinstance(size, pd.Series) else int(size)
+
+    if isinstance(value, BaseFigure):
+        # A figure is kept as the nested dicts it is sent as, about the size of its JSON
+        return len(value.to_json())
+
+    if hasattr(value, "nbytes"):
+        # numpy arrays, and the indexes and leaderboards of the artifacts
+        return int(value.nbytes)
+
+    if hasattr(value, "savefig"):
+        # matplotlib figures hold their artists, sized by their pickle
+        return len(pickle.dumps(value))
+
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value)
+
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value.values())
+
+    return sys.getsizeof(value)
+
+
+
+# ______________________________________________ CACHE ______________________________________________________________________
+class Cache:
+
+    """ thread-safe LRU cache with a time-to-live and a memory cap shared by every session """
+
+    def __init__(self, max_bytes=MAX_BYTES, ttl=TTL):
+        self.entries = TTLCache(maxsize=max_bytes, ttl=ttl, getsizeof=sizeof)
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        with self.lock:
+            try:
+                value = self.entries[key]
+                self.hits += 1
+                return value
+            except KeyError:
+                self.misses += 1
+
+        value = compute()
+
+        with self.lock:
+            try:
+                self.entries[key] = value
+            except ValueError:
+                # Larger than the whole cache, return it without storing
+                pass
+
+        return value
+
+    def drop_version(self, version):
+
+        """ removes the entries of a dataset version, see Registry.get and PageFigures for the keys """
+
+        with self.lock:
+            for key in [key for key in self.entries.keys() if len(key) > 2 and key[2] == version]:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return dict(hits=self.hits, misses=self.misses, entries=len(self.entries),
+                        bytes=int(self.entries.currsize), max_bytes=int(self.entries.maxsize))
+
+
+
+# Process-wide cache shared by every Streamlit session
+default_cache = Cache()
@@ -0,0 +1,72 @@
+import plotly.express as px
+
+from cube import rollup
+from profiling import profiler
+
+
+# Largest figure JSON sent to the browser per chart, in bytes
+PAYLOAD_BUDGET = 100 * 1024
+
+OTHER = "Other"
+
+
+
+# ______________________________________________ HELPER FUNCTIONS __________________________________________________________
+def payload_size(fig):
+    return len(fig.to_json())
+
+
+def keep_top(table, cat, metric, n):
+
+    """ keeps the n categories of cat with the largest total metric and sums the rest into OTHER """
+
+    totals = table.groupby(cat, observed=True)[metric].sum().abs().sort_values(ascending=False)
+    if len(totals) <= n:
+        return table
+
+    table = table.copy()
+    table[cat] = table[cat].astype(str)
+    table.loc[~table[cat].isin(totals.index[:n].astype(str)), cat] = OTHER
+
+    by = [col for col in table.columns if col == cat or col == 'Order_Year']
+    return table.groupby(by, as_index=False, sort=False)[metric].sum()
+
+
+def within_budget(make_fig, table, cat, metric, budget=PAYLOAD_BUDGET):
+
+    """ returns make_fig(table), merging the smallest categories into OTHER until the figure's
+    payload fits in budget or a single category is left """
+
+    fig = make_fig(table)
+    n = table[cat].nunique()
+    while payload_size(fig) > budget and n > 1:
+        n = max(1, n // 2)
+        fig = make_fig(keep_top(table, cat, metric, n))
+
+    return fig
+
+
+
+# ____________________________________________ CATEGORY CHARTS __________________________________________________________________
+def category_histogram(cube, cat, metric, colors, budget=PAYLOAD_BUDGET):
+
+    """ returns the stacked bars of metric per cat and year, drawn from the cube's (cat, year) totals
+    so the figure carries one value per category and year instead of one per order """
+
+    def make_fig(table):
+        return px.histogram(table, x=cat, y=metric, title=cat.upper(), color="Order_Year",
+                            color_discrete_sequence=colors)
+
+    with profiler.section("chart/category_histogram"):
+        return within_budget(make_fig, rollup(cube, [cat, "Order_Year"], [metric]), cat, metric, budget)
+
+
+def category_pie(cube, cat, metric, colors, budget=PAYLOAD_BUDGET):
+
+    """ returns the pie of metric per cat, drawn from the cube's per-category totals """
+
+    def make_fig(table):
+        return px.pie(table, names=cat, values=metric, title=cat.upper(), color_discrete_sequence=colors)
+
+    with profiler.section("chart/category_pie"):
+        return within_budget(make_fig, rollup(cube, [cat], [metric]), cat, metric, budget)
@@ -0,0 +1,123 @@
+import pandas as pd
+
+
+# Dimensions of the rollup; every chart and metric on the dashboard groups by a subset of these
+KEYS = ['Order_Year', 'Order_Month', 'Order_Day', 'Region', 'State', 'Category',
+        'Sub_Category', 'Ship_Mode', 'Segment']
+
+METRICS = ['Sales', 'Quantity', 'Discount', 'Profit']
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August',
+          'September', 'October', 'November', 'December']
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+CALENDAR_ORDER = {'Order_Month': MONTHS, 'Order_Day': DAYS}
+
+
+
+def build_cube(data):
+
+    """ returns the sum of Sales, Quantity, Discount and Profit and the number of order lines
+    (Count) for every observed combination of KEYS """
+
+    cube = data.groupby(KEYS, observed=True, sort=False).agg(
+                Sales=("Sales", "sum"),
+                Quantity=("Quantity", "sum"),
+                Discount=("Discount", "sum"),
+                Profit=("Profit", "sum"),
+                Count=("Sales", "size")).reset_index()
+
+    # The narrow row-level quantity is widened so sums over many cells cannot overflow
+    cube['Quantity'] = cube['Quantity'].astype('int64')
+
+    return cube
+
+
+def merge_cubes(cubes, keys=KEYS):
+
+    """ returns the cube of the union of the rows of several cubes, or of any tables of sums
+    over the columns in keys """
+
+    cube = pd.concat(cubes, ignore_index=True)
+
+    # Chunks may carry different categories, so the keys are grouped as plain values
+    for col in keys:
+        if isinstance(cube[col].dtype, pd.CategoricalDtype):
+            cube[col] = cube[col].astype(str)
+
+    values = [col for col in cube.columns if col not in keys]
+    return cube.groupby(keys, sort=False)[values].sum().reset_index()
+
+
+def calendar_sort(df):
+
+    """ sorts month and day names in calendar order instead of alphabetically """
+
+    cols = [col for col in df.columns if col in CALENDAR_ORDER or col == 'Order_Year']
+    if not cols:
+        return df
+
+    def key(col):
+        if col.name in CALENDAR_ORDER:
+            return col.map({name: i for i, name in enumerate(CALENDAR_ORDER[col.name])})
+        return col
+
+    return df.sort_values(cols, key=key, ignore_index=True)
+
+
+def rollup(cube, by, metrics=METRICS):
+
+    """ returns the cube re-aggregated over the columns in by """
+
+    if isinstance(by, str):
+        by = [by]
+
+    grouped = cube.groupby(by, observed=True, as_index=False)[list(metrics)].sum()
+    return calendar_sort(grouped)
+
+
+def year_slice(cube, year):
+    return cube[cube['Order_Year'] == year]
+
+
+def month_end_index(frame):
+
+    """ returns the month-end dates of the Order_Year and Order_Month columns of frame """
+
+    return pd.DatetimeIndex(pd.to_datetime(
+        frame['Order_Year'].astype(str) + "-" + frame['Order_Month'].astype(str), format="%Y-%B") + pd.offsets.MonthEnd(0))
+
+
+def monthly_series(cube, metric="Sales"):
+
+    """ returns metric per calendar month with a month-end DatetimeIndex, equivalent to
+    resampling the row-level frame with resample('M').sum() """
+
+    months = rollup(cube, ['Order_Year', 'Order_Month'], [metric])
+    months.index = month_end_index(months)
+
+    # Resampling fills months without orders with zero
+    full_range = pd.date_range(months.index.min(), months.index.max(), freq='M')
+    return months[[metric]].reindex(full_range, fill_value=0)
+
+
+def monthly_panel(cube, by, metric="Sales"):
+
+    """ returns one monthly metric series per combination of the columns in by, as the columns of a
+    frame over the full month range of the cube; combinations of several columns are joined with ' / ' """
+
+    if isinstance(by, str):
+        by = [by]
+
+    months = rollup(cube, ['Order_Year', 'Order_Month'] + by, [metric])
+    months['Month'] = month_end_index(months)
+    months['Segment'] = months[by].astype(str).agg(" / ".join, axis=1)
+
+    panel = months.pivot_table(index='Month', columns='Segment', values=metric, aggfunc='sum')
+    full_range = pd.date_range(panel.index.min(), panel.index.max(), freq='M')
+    return panel.reindex(full_range).fillna(0)
+
+
+def quarterly_series(cube, metric="Sales"):
+    return monthly_series(cube, metric).resample('Q').sum()
@@ -0,0 +1,229 @@
+import numpy as np
+import pandas as pd
+
+from cube import METRICS
+
+
+# Dimensions the explorer filters on, besides the order date range
+FILTER_DIMS = ['Region', 'Segment', 'Category', 'Ship_Mode']
+
+
+
+class FilterIndex:
+
+    """ indexes over the order table for filtering any combination of FILTER_DIMS and an order
+    date range, and for aggregating only the selected rows.
+
+    The table is sorted by its Order_Date index, so a date range is a contiguous block of rows found
+    with a binary search. Every value of a filter dimension has a bitmap of its rows, packed 8 rows
+    per byte; the values chosen in one dimension are OR-ed and the dimensions AND-ed, a few bytes per
+    thousand rows. Aggregates are bincounts over the category codes of the selected rows.
+
+    A selection filtered on dates only stays a slice of that block. Its totals come from running
+    totals at every month boundary, built on first use, plus a scan of the rows in its partial first
+    and last months, instead of a pass over every selected row. """
+
+    def __init__(self, data, dims=FILTER_DIMS):
+
+        # A table that is not sorted yet is sorted into a copy the index then owns
+        self.owns_data = not data.index.is_monotonic_increasing
+        if self.owns_data:
+            data = data.sort_index()
+
+        self.data = data
+        self.dates = data.index.values
+        self.codes = {}
+        self.bitmaps = {}
+        self.running = {}
+        self.distinct = {}
+
+        for dim in dims:
+            codes = self.category_codes(dim)
+            self.bitmaps[dim] = {value: np.packbits(codes == i)
+                                 for i, value in enumerate(data[dim].cat.categories)}
+
+        # Month of every row, counted from the first month of the table
+        if len(data):
+            first = data.index[0]
+            self.first_month = pd.Period(first, 'M')
+            self.month_codes = ((data.index.year - first.year) * 12 + data.index.month - first.month).to_numpy()
+            # First row of every month, and the row count as the end of the last one
+            self.month_starts = self.month_codes.searchsorted(np.arange(self.month_codes[-1] + 2))
+
+    @property
+    def nbytes(self):
+
+        """ returns the bytes held by the bitmaps and codes, and by the table when it is a sorted copy """
+
+        arrays = [bitmap for bitmaps in self.bitmaps.values() for bitmap in bitmaps.values()]
+        arrays += list(self.codes.values()) + list(self.running.values())
+        arrays += [getattr(self, "month_codes", np.empty(0)), getattr(self, "month_starts", np.empty(0))]
+        size = sum(array.nbytes for array in arrays)
+        if self.owns_data:
+            size += int(self.data.memory_usage(index=True).sum())
+        return size
+
+    def category_codes(self, col):
+
+        """ returns the category codes of col, computed once per column """
+
+        if col not in self.codes:
+            self.codes[col] = self.data[col].cat.codes.to_numpy()
+        return self.codes[col]
+
+    def values(self, dim):
+        return list(self.bitmaps[dim])
+
+    def date_range(self):
+
+        """ returns the first and last order dates """
+
+        return self.data.index[0], self.data.index[-1]
+
+    def count(self, selection):
+        if isinstance(selection, slice):
+            return selection.stop - selection.start
+        return len(selection)
+
+    def select(self, start=None, end=None, **chosen):
+
+        """ returns the rows ordered from start to end (dates, both included, None for open ends)
+        whose value of every dimension in chosen is one of the chosen values; a dimension chosen as
+        None or empty is not filtered. The rows are a slice when no dimension is filtered, and an
+        array of their positions otherwise """
+
+        lo = 0 if start is None else self.dates.searchsorted(np.datetime64(pd.Timestamp(start)), side='left')
+        hi = len(self.dates) if end is None else \
+            self.dates.searchsorted(np.datetime64(pd.Timestamp(end) + pd.Timedelta(days=1)), side='left')
+
+        mask = None
+        for dim, values in chosen.items():
+            if not values:
+                continue
+            bitmaps = self.bitmaps[dim]
+            empty = np.zeros_like(next(iter(bitmaps.values())))
+            dim_mask = np.bitwise_or.reduce([bitmaps.get(value, empty) for value in values])
+            mask = dim_mask if mask is None else mask & dim_mask
+
+        if mask is None or hi <= lo:
+            return slice(lo, max(lo, hi))
+
+        # Unpack only the bytes covering the date range
+        first_byte = lo // 8
+        bits = np.unpackbits(mask[first_byte:(hi + 7) // 8])[lo - first_byte * 8:hi - first_byte * 8]
+        return np.flatnonzero(bits) + lo
+
+    def _column(self, col, selection):
+        return self.data[col].to_numpy()[selection]
+
+    def _running_totals(self, cat, metric):
+
+        """ returns the totals of metric (the row counts for None) per category of cat (a single
+        column for None) over the rows before every month boundary, one row per boundary """
+
+        key = (cat, metric)
+        if key not in self.running:
+            months = len(self.month_starts) - 1
+            size = 1 if cat is None else len(self.data[cat].cat.categories)
+            codes = self.month_codes * size
+            if cat is not None:
+                codes = codes + self.category_codes(cat)
+            weights = None if metric is None else self.data[metric].to_numpy()
+            totals = np.bincount(codes, weights=weights, minlength=months * size).reshape(months, size)
+            self.running[key] = np.concatenate([np.zeros((1, size), dtype=totals.dtype), totals.cumsum(axis=0)])
+        return self.running[key]
+
+    def _range_totals(self, lo, hi, cat, metric):
+
+        """ returns the totals of metric (the row counts for None) per category of cat (a single
+        total for None) over rows lo to hi: the running totals between the first and last month
+        boundaries in the range, plus a scan of the rows before and after them """
+
+        size = 1 if cat is None else len(self.data[cat].cat.categories)
+
+        def scan(start, stop):
+            weights = None if metric is None else self._column(metric, slice(start, stop))
+            if cat is None:
+                return np.array([stop - start if weights is None else weights.sum(dtype='float64')])
+            return np.bincount(self.category_codes(cat)[start:stop], weights=weights, minlength=size)
+
+        starts = getattr(self, "month_starts", np.zeros(1, dtype=np.int64))
+        first, last = starts.searchsorted(lo, side='left'), starts.searchsorted(hi, side='right') - 1
+        if first >= last:
+            return scan(lo, hi)
+
+        running = self._running_totals(cat, metric)
+        return running[last] - running[first] + scan(lo, starts[first]) + scan(starts[last], hi)
+
+    def _distinct(self, col, selection):
+
+        """ returns the number of distinct values of col over the selected rows, counted once for the
+        whole table """
+
+        whole = isinstance(selection, slice) and (selection.start, selection.stop) == (0, len(self.dates))
+        if whole and col in self.distinct:
+            return self.distinct[col]
+
+        codes = self.category_codes(col)[selection]
+        count = int(np.count_nonzero(np.bincount(codes[codes >= 0], minlength=1)))
+        if whole:
+            self.distinct[col] = count
+        return count
+
+    def key_indicators(self, selection):
+
+        """ returns the dashboard's key indicators over the selected rows """
+
+        if isinstance(selection, slice):
+            totals = {metric: float(self._range_totals(selection.start, selection.stop, None, metric)[0])
+                      for metric in METRICS}
+        else:
+            totals = {metric: self._column(metric, selection).sum(dtype='float64') for metric in METRICS}
+
+        return dict(
+            unique_products = self._distinct("Product_ID", selection),
+            unique_customers = self._distinct("Customer_ID", selection),
+            total_sales = totals["Sales"],
+            total_products_sold = totals["Quantity"],
+            total_discounts = totals["Discount"],
+            net_profit = totals["Profit"])
+
+    def monthly_totals(self, selection, metric="Sales"):
+
+        """ returns metric per month of the selected rows, from their first to their last month """
+
+        if self.count(selection) == 0:
+            return pd.DataFrame({metric: []}, index=pd.DatetimeIndex([]))
+
+        if isinstance(selection, slice):
+            lo, hi = selection.start, selection.stop
+            first, last = self.month_codes[lo], self.month_codes[hi - 1]
+            # Whole months from the running totals, then the rows of the partial first and last months
+            totals = np.diff(self._running_totals(None, metric)[first:last + 2, 0]).astype('float64')
+            starts = self.month_starts
+            totals[0] = self._column(metric, slice(lo, min(hi, starts[first + 1]))).sum(dtype='float64')
+            if last > first:
+                totals[-1] = self._column(metric, slice(starts[last], hi)).sum(dtype='float64')
+        else:
+            months = self.month_codes[selection]
+            first = months.min()
+            totals = np.bincount(months, weights=self._column(metric, selection), minlength=months.max() + 1)[first:]
+
+        index = pd.period_range(self.first_month + int(first), periods=len(totals), freq='M')
+        return pd.DataFrame({metric: totals}, index=index.to_timestamp(how='end').normalize())
+
+    def category_totals(self, selection, cat, metric="Sales"):
+
+        """ returns metric per category of cat over the selected rows, in the order of the categories
+        (calendar order for days and months), leaving out categories without selected rows """
+
+        categories = self.data[cat].cat.categories
+        if isinstance(selection, slice):
+            totals = self._range_totals(selection.start, selection.stop, cat, metric)
+            counts = self._range_totals(selection.start, selection.stop, cat, None)
+        else:
+            codes = self.category_codes(cat)[selection]
+            totals = np.bincount(codes, weights=self._column(metric, selection), minlength=len(categories))
+            counts = np.bincount(codes, minlength=len(categories))
+        table = pd.DataFrame({cat: categories, metric: totals})
+        return table[counts > 0].reset_index(drop=True)
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+import pandas as pd
+
+from ingest import CACHE_DIR
+
+
+# Model used for the dashboard's sales forecast until backtest.py has selected one
+ORDER = (2, 1, 0)
+SEASONAL_ORDER = (1, 0, 0, 12)
+
+# Number of months forecasted
+HORIZON = 12
+
+FORECAST_DIR = os.path.join(CACHE_DIR, "forecast")
+
+# Stored entries kept, the latest included; older ones are deleted when a new one is stored, and the few
+# kept let sessions still rendering a previous dataset version find their forecast
+KEEP_ENTRIES = 3
+
+# Names of the stored entries (and of the model files earlier versions stored next to them)
+ENTRY_FILE = re.compile(r"^[0-9a-f]{16}(\.model)?\.pkl$")
+
+# Refits currently running in the background, keyed on the series hash
+_refits = {}
+_lock = threading.Lock()
+
+
+
+# ______________________________________________ HELPER FUNCTIONS __________________________________________________________
+def series_hash(series, order=ORDER, seasonal_order=SEASONAL_ORDER):
+
+    """ returns a key identifying the monthly series and the model orders """
+
+    digest = hashlib.sha1()
+    digest.update(pd.util.hash_pandas_object(series, index=True).values.tobytes())
+    digest.update(repr((order, seasonal_order)).encode())
+    return digest.hexdigest()[:16]
+
+
+def is_extension(previous, series):
+
+    """ returns True when series is previous with new months appended """
+
+    if len(previous) > len(series):
+        return False
+
+    head = series.iloc[:len(previous)]
+    return head.index.equals(previous.index) and (head.values == previous.values).all()
+
+
+def fit(series, order=ORDER, seasonal_order=SEASONAL_ORDER, start_params=None):
+
+    """ fits the SARIMAX model on series, starting the optimizer from start_params when given """
+
+    # Imported here so serving stored predictions does not load statsmodels
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    model = SARIMAX(series, order=order, seasonal_order=seasonal_order, enforce_invertibility=False)
+    return model.fit(start_params=start_params, disp=0)
+
+
+def predict(results, series, horizon=HORIZON):
+    return pd.DataFrame(results.predict(start=len(series), end=len(series)+horizon-1, typ='level', dynamic=False))
+
+
+
+# ____________________________________________ MODEL SELECTION __________________________________________________________________
+def selection_path(forecast_dir=FORECAST_DIR):
+    return os.path.join(forecast_dir, "selected.json")
+
+
+def load_selection(forecast_dir=FORECAST_DIR):
+
+    """ returns {target: selected model} as written by backtest.py, where target is "Sales" for the
+    dashboard's forecast or a segment type; {} before the first backtest """
+
+    try:
+        with open(selection_path(forecast_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def selected_orders(target="Sales", forecast_dir=FORECAST_DIR):
+
+    """ returns the (order, seasonal_order) selected by backtesting for target, or ORDER and
+    SEASONAL_ORDER when none has been selected """
+
+    model = load_selection(forecast_dir).get(target)
+    if model is None:
+        return ORDER, SEASONAL_ORDER
+
+    return tuple(model["order"]), tuple(model["seasonal_order"])
+
+
+
+# ____________________________________________ MODEL STORE ______________________________________________________________________
+def entry_path(key, forecast_dir=FORECAST_DIR):
+    return os.path.join(forecast_dir, key + ".pkl")
+
+
+def load_entry(key, forecast_dir=FORECAST_DIR):
+
+    """ returns the stored series, parameters and predictions of key, or None """
+
+    path = entry_path(key, forecast_dir)
+    if not os.path.exists(path):
+        return None
+
+    return pd.read_pickle(path)
+
+
+def latest_entry(forecast_dir=FORECAST_DIR):
+
+    """ returns the most recently stored entry, or None """
+
+    try:
+        with open(os.path.join(forecast_dir, "latest.json")) as f:
+            key = json.load(f)["key"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return load_entry(key, forecast_dir)
+
+
+def remove_stale(forecast_dir=FORECAST_DIR, keep=KEEP_ENTRIES):
+
+    """ deletes all but the keep most recently stored entries """
+
+    paths = [os.path.join(forecast_dir, name) for name in os.listdir(forecast_dir) if ENTRY_FILE.match(name)]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Removed by a concurrent refit
+            pass
+
+
+def save_entry(key, series, results, predictions, forecast_dir=FORECAST_DIR):
+
+    """ stores the series, parameters and predictions the dashboard reads, marks key as latest and
+    deletes the older entries; the parameters are all a later refit starts from """
+
+    os.makedirs(forecast_dir, exist_ok=True)
+
+    model = results.model
+    entry = dict(key=key, series=series, params=results.params, predictions=predictions,
+                 order=tuple(model.order), seasonal_order=tuple(model.seasonal_order))
+    tmp_path = entry_path(key, forecast_dir) + ".tmp"
+    pd.to_pickle(entry, tmp_path)
+    os.replace(tmp_path, entry_path(key, forecast_dir))
+
+    tmp_path = os.path.join(forecast_dir, "latest.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(dict(key=key), f)
+    os.replace(tmp_path, os.path.join(forecast_dir, "latest.json"))
+
+    remove_stale(forecast_dir)
+    return entry
+
+
+
+# ____________________________________________ FORECAST SERVICE _________________________________________________________________
+def refit(series, key, previous=None, forecast_dir=FORECAST_DIR, order=ORDER, seasonal_order=SEASONAL_ORDER):
+
+    """ fits and stores the model of series, warm-started from the previous parameters
+    when series only appends months to the previously stored series of the same model """
+
+    start_params = None
+    same_model = previous is not None and (previous.get("order", ORDER), previous.get("seasonal_order", SEASONAL_ORDER)) \
+        == (tuple(order), tuple(seasonal_order))
+    if same_model and is_extension(previous["series"], series):
+        start_params = previous["params"]
+
+    results = fit(series, order, seasonal_order, start_params=start_params)
+    return save_entry(key, series, results, predict(results, series), forecast_dir)
+
+
+def _refit_in_background(series, key, previous, forecast_dir, order, seasonal_order):
+    try:
+        refit(series, key, previous, forecast_dir, order, seasonal_order)
+    finally:
+        with _lock:
+            _refits.pop(key, None)
+
+
+def get_forecast(series, background=True, forecast_dir=FORECAST_DIR):
+
+    """ returns (predictions, up_to_date) for the monthly series, from the model selected by
+    backtesting (see selected_orders).
+
+    Stored predictions are returned as they are. When the series or the selected model changed, the
+    previous predictions are returned with up_to_date=False while the model is refit in a background
+    thread; without previous predictions, or with background=False, the fit runs before returning """
+
+    order, seasonal_order = selected_orders("Sales", forecast_dir)
+    key = series_hash(series, order, seasonal_order)
+    entry = load_entry(key, forecast_dir)
+    if entry is not None:
+        return entry["predictions"], True
+
+    previous = latest_entry(forecast_dir)
+    if previous is None or not background:
+        return refit(series, key, previous, forecast_dir, order, seasonal_order)["predictions"], True
+
+    with _lock:
+        if key not in _refits:
+            thread = threading.Thread(target=_refit_in_background,
+                                      args=(series, key, previous, forecast_dir, order, seasonal_order), daemon=True)
+            _refits[key] = thread
+            thread.start()
+
+    return previous["predictions"], False
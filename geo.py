@@ -0,0 +1,81 @@
+import numpy as np
+
+from cube import METRICS
+
+
+state_codes = {
+    'District of Columbia' : 'dc','Mississippi': 'MS', 'Oklahoma': 'OK', 
+    'Delaware': 'DE', 'Minnesota': 'MN', 'Illinois': 'IL', 'Arkansas': 'AR', 
+    'New Mexico': 'NM', 'Indiana': 'IN', 'Maryland': 'MD', 'Louisiana': 'LA', 
+    'Idaho': 'ID', 'Wyoming': 'WY', 'Tennessee': 'TN', 'Arizona': 'AZ', 
+    'Iowa': 'IA', 'Michigan': 'MI', 'Kansas': 'KS', 'Utah': 'UT', 
+    'Virginia': 'VA', 'Oregon': 'OR', 'Connecticut': 'CT', 'Montana': 'MT', 
+    'California': 'CA', 'Massachusetts': 'MA', 'West Virginia': 'WV', 
+    'South Carolina': 'SC', 'New Hampshire': 'NH', 'Wisconsin': 'WI',
+    'Vermont': 'VT', 'Georgia': 'GA', 'North Dakota': 'ND', 
+    'Pennsylvania': 'PA', 'Florida': 'FL', 'Alaska': 'AK', 'Kentucky': 'KY', 
+    'Hawaii': 'HI', 'Nebraska': 'NE', 'Missouri': 'MO', 'Ohio': 'OH', 
+    'Alabama': 'AL', 'Rhode Island': 'RI', 'South Dakota': 'SD', 
+    'Colorado': 'CO', 'New Jersey': 'NJ', 'Washington': 'WA', 
+    'North Carolina': 'NC', 'New York': 'NY', 'Texas': 'TX', 
+    'Nevada': 'NV', 'Maine': 'ME'}
+
+
+
+# ______________________________________________ HELPER FUNCTIONS __________________________________________________________
+def encode_states(states, codes=state_codes):
+
+    """ returns (state code per row, unknown state names) for a State column.
+
+    Codes are resolved once per distinct state through a lookup table indexed by the categorical
+    codes of the column; rows of states missing from codes get None instead of raising """
+
+    states = states.astype('category')
+    categories = states.cat.categories
+    lookup = np.array([codes.get(state) for state in categories] + [None], dtype=object)
+
+    # Missing values have categorical code -1, which picks the trailing None
+    row_codes = lookup[states.cat.codes.to_numpy()]
+    unknown = [state for state in categories if state not in codes]
+    return row_codes, unknown
+
+
+
+class GeoIndex:
+
+    """ sums of the metrics per (Order_Year, State, City), computed once per dataset and shared by
+    the choropleth and the top-cities charts """
+
+    def __init__(self, data):
+        self._index(data.groupby(['Order_Year', 'State', 'City'], observed=True)[METRICS].sum().reset_index())
+
+    @classmethod
+    def from_table(cls, table):
+
+        """ returns the index of precomputed metric sums per (Order_Year, State, City), e.g. from a SQL backend """
+
+        index = cls.__new__(cls)
+        index._index(table)
+        return index
+
+    def _index(self, table):
+        self.table = table
+        self.table['State_code'], self.unknown_states = encode_states(self.table['State'])
+
+    @property
+    def nbytes(self):
+        return int(self.table.memory_usage(index=True).sum())
+
+    def state_totals(self, metric="Sales", year=None):
+
+        """ returns metric per state code, leaving out states without a code """
+
+        table = self.table if year is None else self.table[self.table['Order_Year'] == int(year)]
+        table = table[table['State_code'].notna()]
+        return table.groupby('State_code', as_index=False)[metric].sum()
+
+    def year_city_totals(self):
+
+        """ returns the metric sums per (Order_Year, City), the input of the cities leaderboard """
+
+        return self.table.groupby(['Order_Year', 'City'], observed=True, as_index=False)[METRICS].sum()
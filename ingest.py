@@ -0,0 +1,190 @@
+import hashlib
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from cube import DAYS, MONTHS
+
+
+# Directory holding the converted Arrow files
+CACHE_DIR = ".superstore_cache"
+
+# Text columns stored as dictionary (categorical) arrays: the low-cardinality attributes and, as
+# dictionary-encoded IDs, the order, product and customer columns
+CATEGORICAL_COLS = ['Region', 'Segment', 'Category', 'Sub_Category', 'Ship_Mode', 'State', 'City', 'Country',
+                    'Order_ID', 'Customer_ID', 'Customer_Name', 'Product_ID', 'Product_Name']
+
+DATE_COLS = ['Order_Date', 'Ship_Date']
+
+# Types of the columns read from the order file; Sales, Profit and Discount stay float64, since a float32
+# discount such as 0.2 is off in its eighth digit and the error adds up in every sum
+CSV_DTYPES = dict({col: 'category' for col in CATEGORICAL_COLS},
+                  Row_ID='int64', Postal_Code='Int32', Quantity='int16', Discount='float64',
+                  Sales='float64', Profit='float64')
+
+# Version of the column types above, part of the converted file names so a change of types reconverts
+SCHEMA_VERSION = 2
+
+# Types of the derived date parts; day and month names keep their calendar order as integer codes
+DATE_PART_DTYPES = dict(Order_Day=pd.CategoricalDtype(DAYS, ordered=True),
+                        Order_Month=pd.CategoricalDtype(MONTHS, ordered=True),
+                        Order_Year='int16')
+
+# Rows per chunk in streaming mode
+CHUNK_SIZE = 500_000
+
+
+
+# ______________________________________________ HELPER FUNCTIONS __________________________________________________________
+def file_fingerprint(path, chunk_size=1 << 20):
+
+    """ returns a key built from the sha1 of the file contents and its modification time """
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return "{}-{}".format(digest.hexdigest()[:16], os.stat(path).st_mtime_ns)
+
+
+# Fingerprints already computed, keyed on (path, size, mtime) so an unchanged file is not rehashed
+_fingerprints = {}
+
+
+def dataset_version(path):
+
+    """ returns file_fingerprint(path), hashing the file again only when its size or mtime changed """
+
+    stat = os.stat(path)
+    stat_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if stat_key not in _fingerprints:
+        _fingerprints[stat_key] = file_fingerprint(path)
+
+    return _fingerprints[stat_key]
+
+
+def cache_path(csv_path, key, cache_dir=CACHE_DIR):
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, "{}-{}-s{}.arrow".format(stem, key, SCHEMA_VERSION))
+
+
+
+# ____________________________________________ DATA PREPROCESSING AND FEATURE ENGINEERING ______________________________________
+def preprocess(df, sort=True):
+
+    """ applies the dashboard's cleaning and feature engineering to a raw order frame """
+
+    data = df.drop(['Row_ID'], axis=1)
+
+    # Set date columns as datetime
+    data[DATE_COLS] = data[DATE_COLS].apply(pd.to_datetime, format="%m/%d/%Y")
+
+    # Sort data by 'Order Date'
+    if sort:
+        data = data.sort_values(by='Order_Date', ignore_index=True)
+
+    # Extract day, month and year from data
+    data['Order_Day'] = data['Order_Date'].dt.day_name()
+    data['Order_Month'] = data['Order_Date'].dt.month_name()
+    data['Order_Year'] = data['Order_Date'].dt.year
+
+    return apply_schema(data)
+
+
+def apply_schema(data):
+
+    """ casts the columns of a preprocessed frame to CSV_DTYPES and DATE_PART_DTYPES; columns
+    already of the right type are left as they are """
+
+    for col, dtype in list(CSV_DTYPES.items()) + list(DATE_PART_DTYPES.items()):
+        if col in data.columns and data[col].dtype != dtype:
+            data[col] = data[col].astype(dtype)
+
+    return data
+
+
+def read_csv(csv_path):
+    return preprocess(pd.read_csv(csv_path, encoding='latin1', dtype=CSV_DTYPES))
+
+
+def read_chunks(csv_path, chunksize=CHUNK_SIZE):
+
+    """ yields the order file as preprocessed frames of at most chunksize rows; chunks are not
+    sorted against each other """
+
+    for chunk in pd.read_csv(csv_path, encoding='latin1', dtype=CSV_DTYPES, chunksize=chunksize):
+        yield preprocess(chunk, sort=False)
+
+
+
+
+# ____________________________________________ ARROW CACHE ______________________________________________________________________
+def write_arrow(data, path):
+
+    """ writes data to an uncompressed Arrow IPC file so it can be memory-mapped on load """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    table = pa.Table.from_pandas(data, preserve_index=False)
+
+    # Write to a temporary file first so a concurrent reader never sees a partial file
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_arrow(path, shared=False):
+
+    """ memory-maps an Arrow IPC file and returns it as a DataFrame; with shared=True the numeric,
+    date and categorical code columns stay read-only views of the mapped file instead of copies """
+
+    if shared:
+        # The mapping stays open for as long as the frame's columns reference it
+        table = ipc.open_file(pa.memory_map(path, "r")).read_all()
+        return apply_schema(table.to_pandas(split_blocks=True))
+
+    with pa.memory_map(path, "r") as source:
+        table = ipc.open_file(source).read_all()
+
+    return apply_schema(table.to_pandas())
+
+
+def remove_stale(csv_path, keep, cache_dir=CACHE_DIR):
+
+    """ deletes converted files of csv_path other than keep """
+
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    if not os.path.isdir(cache_dir):
+        return
+
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith(stem + "-") and name.endswith(".arrow") and path != keep:
+            os.remove(path)
+
+
+def load_orders(csv_path, cache_dir=CACHE_DIR, shared=False):
+
+    """ returns the preprocessed order table, converting csv_path to Arrow on the first call
+    and memory-mapping the converted file while the source file is unchanged; see read_arrow
+    for shared """
+
+    key = dataset_version(csv_path)
+    path = cache_path(csv_path, key, cache_dir)
+
+    if os.path.exists(path):
+        return read_arrow(path, shared)
+
+    data = read_csv(csv_path)
+    try:
+        write_arrow(data, path)
+        remove_stale(csv_path, path, cache_dir)
+    except OSError:
+        # A read-only deployment still gets the data, just without the cache
+        return data
+
+    return read_arrow(path, shared) if shared else data
@@ -0,0 +1,25 @@
+import pandas as pd
+
+
+
+def order_years(dates):
+
+    """ returns the years of a sorted Order_Date index.
+
+    Every year is a contiguous block of the sorted dates, so each one is found with a binary search
+    from the first to the last year instead of a pass over every row """
+
+    if len(dates) == 0:
+        return []
+
+    if not dates.is_monotonic_increasing:
+        dates = dates.sort_values()
+
+    years = []
+    for year in range(dates[0].year, dates[-1].year + 1):
+        start = dates.searchsorted(pd.Timestamp(year, 1, 1), side='left')
+        stop = dates.searchsorted(pd.Timestamp(year + 1, 1, 1), side='left')
+        if stop > start:
+            years.append(year)
+
+    return years
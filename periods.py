@@ -0,0 +1,71 @@
+import pandas as pd
+
+from cube import METRICS, month_end_index, rollup
+
+
+# Period frequencies: year-over-year, quarter-over-quarter and month-over-month
+FREQS = ['Y', 'Q', 'M']
+
+
+
+# ______________________________________________ HELPER FUNCTIONS __________________________________________________________
+def period_key(dates, freq):
+
+    """ returns the period of every date: the year as an int for 'Y', a pandas Period otherwise """
+
+    if freq == 'Y':
+        return dates.year
+    return dates.to_period(freq)
+
+
+def distinct_customers(data, freq='Y'):
+
+    """ returns the number of distinct customers per period of the row-level data """
+
+    return data.groupby(period_key(data.index, freq))['Customer_ID'].nunique()
+
+
+def monthly_totals(cube):
+
+    """ returns the totals of every metric and the line count per month, over the full month range,
+    from a single grouped pass over the cube """
+
+    months = rollup(cube, ['Order_Year', 'Order_Month'], METRICS + ['Count'])
+    months.index = month_end_index(months)
+    full_range = pd.date_range(months.index.min(), months.index.max(), freq='M')
+    return months[METRICS + ['Count']].reindex(full_range, fill_value=0)
+
+
+
+# ______________________________________________ PERIOD TABLES _____________________________________________________________
+def period_table(monthly, freq='Y', data=None, customers=None):
+
+    """ returns one row per period with the totals of every metric, the distinct customers when the
+    row-level data or the customers per period are given, and the percent change of each from the
+    previous period in Pct_<column> (0 for the first period) """
+
+    table = monthly.groupby(period_key(monthly.index, freq))[METRICS + ['Count']].sum()
+
+    if customers is None and data is not None:
+        customers = distinct_customers(data, freq)
+
+    if customers is not None:
+        table['Customers'] = customers.reindex(table.index, fill_value=0)
+
+    for col in list(table.columns):
+        table['Pct_' + col] = table[col].pct_change().fillna(0) * 100
+
+    table.index.name = 'Period'
+    return table
+
+
+def period_tables(cube, data=None, freqs=FREQS, customer_freqs=FREQS, customers=None):
+
+    """ returns {freq: period_table} for every frequency in freqs, all derived from one pass over
+    the cube; distinct customers, for the frequencies in customer_freqs, add one pass over data each
+    unless customers already maps the frequency to them """
+
+    monthly = monthly_totals(cube)
+    customers = customers or {}
+    return {freq: period_table(monthly, freq, data if freq in customer_freqs else None, customers.get(freq))
+            for freq in freqs}
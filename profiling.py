@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import psutil
+
+
+
+class Profiler:
+
+    """ process-wide timers, memory probes and hit/miss counters of the dashboard sections.
+
+    A section records its wall time and the change of the process' resident memory; nested
+    sections are inclusive, e.g. an artifact's time contains the time of the artifacts it needs. """
+
+    def __init__(self):
+        self.process = psutil.Process()
+        self.lock = threading.Lock()
+        self.sections = {}
+        self.counters = {}
+
+    @contextmanager
+    def section(self, name):
+        rss = self.process.memory_info().rss
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.record(name, seconds, self.process.memory_info().rss - rss)
+
+    def record(self, name, seconds, rss_delta=0):
+        with self.lock:
+            stats = self.sections.setdefault(name, dict(calls=0, total_seconds=0.0, last_seconds=0.0,
+                                                        max_seconds=0.0, last_rss_delta=0))
+            stats["calls"] += 1
+            stats["total_seconds"] += seconds
+            stats["last_seconds"] = seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["last_rss_delta"] = rss_delta
+
+    def count(self, name, event):
+
+        """ increments the counter of event (e.g. "hit" or "miss") for name """
+
+        with self.lock:
+            counters = self.counters.setdefault(name, {})
+            counters[event] = counters.get(event, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.sections = {}
+            self.counters = {}
+
+    def snapshot(self):
+
+        """ returns one row per section with its timings, memory change and hit/miss counts """
+
+        with self.lock:
+            rows = []
+            for name in sorted(set(self.sections) | set(self.counters)):
+                row = dict(section=name, **self.sections.get(name, {}))
+                row.update(self.counters.get(name, {}))
+                rows.append(row)
+
+        return pd.DataFrame(rows).set_index("section") if rows else pd.DataFrame()
+
+    def to_prometheus(self, extra_gauges=None):
+
+        """ returns the measurements in the Prometheus text exposition format """
+
+        with self.lock:
+            sections = {name: dict(stats) for name, stats in self.sections.items()}
+            counters = {name: dict(events) for name, events in self.counters.items()}
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, kind))
+            for labels, value in samples:
+                label_text = ",".join('{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in labels.items())
+                lines.append("{}{{{}}} {}".format(name, label_text, value))
+
+        metric("superstore_section_calls_total", "counter", "Times a section ran.",
+               [(dict(section=name), stats["calls"]) for name, stats in sections.items()])
+        metric("superstore_section_seconds_total", "counter", "Total wall time spent in a section.",
+               [(dict(section=name), stats["total_seconds"]) for name, stats in sections.items()])
+        metric("superstore_section_last_seconds", "gauge", "Wall time of the last run of a section.",
+               [(dict(section=name), stats["last_seconds"]) for name, stats in sections.items()])
+        metric("superstore_section_rss_delta_bytes", "gauge", "Resident memory change during the last run of a section.",
+               [(dict(section=name), stats["last_rss_delta"]) for name, stats in sections.items()])
+        metric("superstore_events_total", "counter", "Cache hits and misses per section.",
+               [(dict(section=name, event=event), n) for name, events in counters.items() for event, n in events.items()])
+
+        for name, value in (extra_gauges or {}).items():
+            metric("superstore_" + name, "gauge", name.replace("_", " ") + ".", [({}, value)])
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, extra_gauges=None):
+
+        """ writes to_prometheus() to path atomically, for a node exporter textfile collector to scrape """
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus(extra_gauges))
+        os.replace(tmp_path, path)
+
+    def write_log(self, path, **context):
+
+        """ appends one JSON line per section to path """
+
+        snapshot = self.snapshot()
+        with open(path, "a") as f:
+            for name, row in snapshot.iterrows():
+                entry = dict(time=time.time(), section=name, **context)
+                entry.update({k: v for k, v in row.items() if pd.notna(v)})
+                f.write(json.dumps(entry, default=float) + "\n")
+
+
+
+# Process-wide profiler shared by every session
+profiler = Profiler()
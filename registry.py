@@ -0,0 +1,92 @@
+import inspect
+
+from cache import default_cache
+from profiling import profiler as default_profiler
+
+
+
+class Registry:
+
+    """ registry of the dashboard's artifacts (data, tables, figures) and of the pages using them.
+
+    An artifact is a function whose parameter names are other artifacts, plus `version` for the
+    dataset version. Artifacts are computed only when a page being rendered needs them, directly
+    or through another artifact, and are memoized per dataset version in the process-wide cache. """
+
+    def __init__(self, cache=default_cache, profiler=default_profiler):
+        self.cache = cache
+        self.profiler = profiler
+        self.artifacts = {}
+        self.memoized = {}
+        self.pages = {}
+        self.provided = {}
+
+    def artifact(self, func=None, memoize=True):
+
+        """ decorator registering func as the artifact named after it; memoize=False recomputes it
+        on every request, for artifacts that are cheap but may change within a dataset version """
+
+        def register(func):
+            self.artifacts[func.__name__] = func
+            self.memoized[func.__name__] = memoize
+            return func
+
+        return register(func) if func is not None else register
+
+    def page(self, name):
+
+        """ decorator registering func as the page name; its parameters are the artifacts it needs """
+
+        def register(func):
+            self.pages[name] = func
+            return func
+
+        return register
+
+    def provide(self, version, values):
+
+        """ sets artifacts of the dataset version from values, e.g. loaded from a snapshot bundle,
+        so they are returned as they are instead of being computed """
+
+        self.provided.setdefault(version, {}).update(values)
+
+    def forget(self, version):
+        self.provided.pop(version, None)
+
+    def needs(self, name):
+        return list(inspect.signature(self.artifacts[name]).parameters)
+
+    def get(self, name, version):
+
+        """ returns artifact name for the dataset version, computing it and its dependencies if needed """
+
+        if name == "version":
+            return version
+
+        if name in self.provided.get(version, ()):
+            return self.provided[version][name]
+
+        func = self.artifacts[name]
+        section = "artifact/" + name
+        computed = []
+
+        def compute():
+            computed.append(True)
+            with self.profiler.section(section):
+                return func(**{dep: self.get(dep, version) for dep in self.needs(name)})
+
+        if not self.memoized[name]:
+            return compute()
+
+        value = self.cache.get(("artifact", name, version), compute)
+        self.profiler.count(section, "miss" if computed else "hit")
+        return value
+
+    def render(self, name, version):
+
+        """ renders page name with only the artifacts it declares """
+
+        func = self.pages[name]
+        params = inspect.signature(func).parameters
+        with self.profiler.section("page/" + name):
+            return func(**{dep: self.get(dep, version) for dep in params})
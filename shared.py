@@ -0,0 +1,89 @@
+import threading
+from contextlib import contextmanager
+
+from cache import default_cache
+from ingest import dataset_version, load_orders
+
+
+
+class SharedDataset:
+
+    """ one immutable copy of the order table per dataset version, shared by every session.
+
+    The table is memory-mapped read-only from the Arrow cache, so its columns live in the page
+    cache rather than in each session's memory. A script run holds a lease on the version it
+    renders; when the source file changes, the next lease loads the new version once, and the old
+    one is released, together with its cached artifacts, as soon as its last lease ends. """
+
+    def __init__(self, csv_path, cache=default_cache):
+        self.csv_path = csv_path
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.current = None
+        self.tables = {}
+        self.leases = {}
+
+    def _load(self):
+
+        """ returns the table indexed by Order_Date, without copying the mapped columns """
+
+        table = load_orders(self.csv_path, shared=True)
+        table.set_index('Order_Date', inplace=True)
+        return table
+
+    @contextmanager
+    def lease(self):
+
+        """ yields the current dataset version, keeping its table loaded until the block exits """
+
+        version = dataset_version(self.csv_path)
+
+        with self.lock:
+            if version not in self.tables:
+                # Loaded under the lock so concurrent sessions never map the same version twice
+                self.tables[version] = self._load()
+                self.leases[version] = 0
+            self.leases[version] += 1
+            self.current = version
+            self._release_unused()
+
+        try:
+            yield version
+        finally:
+            with self.lock:
+                self.leases[version] -= 1
+                self._release_unused()
+
+    def _release_unused(self):
+        for version in [v for v, n in self.leases.items() if n == 0 and v != self.current]:
+            del self.tables[version]
+            del self.leases[version]
+            self.cache.drop_version(version)
+
+    def data(self, version):
+
+        """ returns the shared table of a leased version; sessions must not modify it """
+
+        with self.lock:
+            return self.tables[version]
+
+    def stats(self):
+        with self.lock:
+            return dict(versions=len(self.tables), leases=sum(self.leases.values()))
+
+
+
+# Process-wide datasets, one per order file; Streamlit re-executes the app script on every run,
+# so they live here rather than in superstore.py
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+
+def shared_dataset(csv_path):
+
+    """ returns the process-wide SharedDataset of csv_path """
+
+    with _datasets_lock:
+        if csv_path not in _datasets:
+            _datasets[csv_path] = SharedDataset(csv_path)
+        return _datasets[csv_path]
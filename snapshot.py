@@ -0,0 +1,209 @@
+""" Snapshot bundles of the dashboard.
+
+Renders the metric values and figures of every page for the current version of the order file into
+a bundle directory, which the app then serves instead of computing them:
+
+    python snapshot.py --out snapshots
+    SUPERSTORE_SNAPSHOT=snapshots streamlit run superstore.py
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import plotly.io as pio
+from plotly.basedatatypes import BaseFigure
+
+from artifacts import PageFigures, dataset, query_leaderboards, registry
+from forecast import get_forecast
+
+
+SNAPSHOT_DIR = "snapshots"
+
+# Artifacts the pages read, see general_page and year_page in superstore.py
+SNAPSHOT_ARTIFACTS = ['years', 'key_indicators', 'periods', 'months_fig', 'year_fig', 'seasonal_plots', 'forecast',
+                      'forecast_model', 'forecast_fig', 'segment_forecasts', 'geo_index', 'geo_fig', 'leaderboards', 'figures']
+
+# Loaded bundles, keyed on their directory; only the latest one served is kept
+_snapshots = {}
+_lock = threading.Lock()
+
+
+
+# ______________________________________________ HELPER FUNCTIONS __________________________________________________________
+def dump_value(value, directory, name):
+
+    """ writes value to directory and returns the file name: plotly figures as figure JSON, the page
+    figures as a JSON list of them, anything else pickled """
+
+    if isinstance(value, BaseFigure):
+        file_name = name + ".json"
+        with open(os.path.join(directory, file_name), "w") as f:
+            f.write(value.to_json())
+
+    elif isinstance(value, PageFigures):
+        file_name = name + ".figures.json"
+        entries = []
+        for key in list(value.drawn):
+            # Redrawn if the cache evicted it since it was drawn
+            figs = value.figure(key)
+            many = isinstance(figs, list)
+            entries.append(dict(key=list(key), many=many, figures=[fig.to_json() for fig in (figs if many else [figs])]))
+        with open(os.path.join(directory, file_name), "w") as f:
+            json.dump(entries, f)
+
+    else:
+        file_name = name + ".pkl"
+        pd.to_pickle(value, os.path.join(directory, file_name))
+
+    return file_name
+
+
+def load_value(path):
+
+    """ returns the value dump_value wrote to path """
+
+    if path.endswith(".figures.json"):
+        with open(path) as f:
+            entries = json.load(f)
+        return SnapshotFigures({tuple(entry["key"]): entry for entry in entries})
+
+    if path.endswith(".json"):
+        with open(path) as f:
+            return pio.from_json(f.read())
+
+    return pd.read_pickle(path)
+
+
+def bundle_dir(path):
+
+    """ returns the bundle directory of path, which is either a bundle or a snapshot directory
+    whose latest.json names the latest bundle """
+
+    try:
+        with open(os.path.join(path, "latest.json")) as f:
+            return os.path.join(path, json.load(f)["version"])
+    except (OSError, ValueError, KeyError):
+        return path
+
+
+
+class SnapshotFigures(PageFigures):
+
+    """ page figures of a bundle, each decoded from its JSON when a page first shows it since
+    decoding and validating every figure of every page would slow down the start """
+
+    def __init__(self, entries):
+        super().__init__()
+        self.entries = entries
+
+    def _get(self, key, make):
+
+        def decode():
+            entry = self.entries[key]
+            figs = [pio.from_json(fig) for fig in entry["figures"]]
+            return figs if entry["many"] else figs[0]
+
+        return super()._get(key, decode)
+
+
+
+# ____________________________________________ BUILD ______________________________________________________________________
+def build_snapshot(registry, version, out_dir=SNAPSHOT_DIR, names=SNAPSHOT_ARTIFACTS):
+
+    """ writes the artifacts in names of registry for the dataset version to out_dir/<version>,
+    marks the bundle as latest and returns its directory """
+
+    # The bundle carries an up-to-date forecast, fitted now if needed rather than in the background
+    registry.provide(version, dict(forecast=get_forecast(registry.get("months_df", version), background=False)))
+    years = registry.get("years", version)
+    registry.get("figures", version).draw_all(years)
+    query_leaderboards(registry.get("leaderboards", version), years)
+
+    bundle = os.path.join(out_dir, version)
+    tmp_bundle = bundle + ".tmp"
+    shutil.rmtree(tmp_bundle, ignore_errors=True)
+    os.makedirs(tmp_bundle)
+
+    try:
+        files = {name: dump_value(registry.get(name, version), tmp_bundle, name) for name in names}
+        with open(os.path.join(tmp_bundle, "manifest.json"), "w") as f:
+            json.dump(dict(version=version, created=time.time(), artifacts=files), f, indent=1)
+    except BaseException:
+        shutil.rmtree(tmp_bundle, ignore_errors=True)
+        raise
+
+    shutil.rmtree(bundle, ignore_errors=True)
+    os.replace(tmp_bundle, bundle)
+
+    tmp_path = os.path.join(out_dir, "latest.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(dict(version=version), f)
+    os.replace(tmp_path, os.path.join(out_dir, "latest.json"))
+
+    return bundle
+
+
+
+# ____________________________________________ SERVE ______________________________________________________________________
+class Snapshot:
+
+    """ the artifacts of one bundle, loaded once; lease and stats mirror SharedDataset so the app
+    serves a bundle the same way it serves the shared dataset """
+
+    def __init__(self, bundle):
+        with open(os.path.join(bundle, "manifest.json")) as f:
+            manifest = json.load(f)
+
+        self.bundle = bundle
+        self.version = manifest["version"]
+        self.values = {name: load_value(os.path.join(bundle, file_name))
+                       for name, file_name in manifest["artifacts"].items()}
+
+    @contextmanager
+    def lease(self):
+        yield self.version
+
+    def stats(self):
+        return dict(versions=1, artifacts=len(self.values))
+
+
+def serve_snapshot(registry, path):
+
+    """ returns the Snapshot of the latest bundle in path, with its artifacts provided to registry;
+    a newly published bundle replaces the one served before """
+
+    bundle = bundle_dir(path)
+
+    with _lock:
+        if bundle not in _snapshots:
+            snapshot = Snapshot(bundle)
+            for previous in _snapshots.values():
+                registry.forget(previous.version)
+            _snapshots.clear()
+            _snapshots[bundle] = snapshot
+            registry.provide(snapshot.version, snapshot.values)
+
+        return _snapshots[bundle]
+
+
+
+# ____________________________________________ COMMAND LINE ______________________________________________________________
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every page of the dashboard into a snapshot bundle.")
+    parser.add_argument("--out", default=SNAPSHOT_DIR, help="snapshot directory")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    with dataset.lease() as version:
+        bundle = build_snapshot(registry, version, args.out)
+
+    print("{} in {:.1f}s".format(bundle, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ingest import read_csv
+
+
+SAMPLE_FILE = os.path.join(ROOT, "Sample_Superstore.csv")
+
+
+
+@pytest.fixture(scope="session")
+def sample_file():
+
+    """ returns the path of the sample export the tests read """
+
+    return SAMPLE_FILE
+
+
+@pytest.fixture(scope="session")
+def orders(sample_file):
+
+    """ the preprocessed sample orders indexed by Order_Date, as the shared dataset serves them """
+
+    return read_csv(sample_file).set_index('Order_Date')
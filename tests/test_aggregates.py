@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import RunningAggregates, append_orders, stream_aggregates
+from backends import AggregatesBackend, PandasBackend
+from cube import KEYS, METRICS, build_cube, monthly_series, rollup
+from ingest import CSV_DTYPES
+from periods import period_tables
+
+
+@pytest.fixture(scope="module")
+def aggregates(sample_file):
+    # Small chunks, so rows of a cell are spread over many chunk cubes and merges
+    return stream_aggregates(sample_file, chunksize=700)
+
+
+@pytest.fixture(scope="module")
+def cube(orders):
+    return build_cube(orders)
+
+
+@pytest.fixture(scope="module")
+def raw(sample_file):
+    return pd.read_csv(sample_file, encoding='latin1', dtype=CSV_DTYPES)
+
+
+
+@pytest.mark.parametrize("by", [[key] for key in KEYS] + [['Category', 'Order_Year'], ['Order_Year', 'Order_Month']])
+def test_rollups_match_build_cube(aggregates, cube, by):
+    streamed, expected = rollup(aggregates.cube, by, METRICS + ['Count']), rollup(cube, by, METRICS + ['Count'])
+    for col in by:
+        assert list(streamed[col].astype(str)) == list(expected[col].astype(str))
+    assert (streamed['Count'] == expected['Count']).all()
+    for metric in METRICS:
+        np.testing.assert_allclose(streamed[metric], expected[metric])
+
+
+def test_key_indicators_and_monthly_series(orders, aggregates, cube):
+    key_indicators = aggregates.key_indicators()
+    assert aggregates.rows == len(orders)
+    assert key_indicators["unique_products"] == orders["Product_ID"].nunique()
+    assert key_indicators["unique_customers"] == orders["Customer_ID"].nunique()
+    assert key_indicators["total_products_sold"] == orders["Quantity"].sum()
+    assert isinstance(key_indicators["total_products_sold"], int)
+    assert key_indicators["total_sales"] == pytest.approx(orders["Sales"].sum())
+
+    pd.testing.assert_frame_equal(aggregates.monthly_series("Sales"), monthly_series(cube, "Sales"), check_freq=False)
+
+
+def test_backend_matches_pandas(orders, aggregates):
+    backend, expected = AggregatesBackend(aggregates), PandasBackend(orders)
+    assert backend.years() == expected.years()
+    assert backend.distinct_counts() == expected.distinct_counts()
+
+    periods = period_tables(backend.cube(), customers={'Y': backend.distinct_customers('Y')})
+    expected_periods = period_tables(expected.cube(), customers={'Y': expected.distinct_customers('Y')})
+    for freq, table in expected_periods.items():
+        pd.testing.assert_frame_equal(periods[freq], table, check_dtype=False)
+
+    pd.testing.assert_frame_equal(backend.geo_index().state_totals("Profit", 2015),
+                                  expected.geo_index().state_totals("Profit", 2015))
+
+
+def test_append_matches_stream_and_stamps_touched_years(raw, aggregates, tmp_path):
+    month = pd.to_datetime(raw['Order_Date'], format="%m/%d/%Y").dt.to_period('M')
+    base = tmp_path / "base.csv"
+    raw[month < pd.Period("2017-11", 'M')].to_csv(base, index=False)
+
+    path = str(tmp_path / "aggregates.pkl")
+    append_orders(raw[month == pd.Period("2017-11", 'M')], path, base=str(base), forecast=False)
+    before = RunningAggregates.load(path).year_stamps()
+    assert append_orders(raw[month == pd.Period("2017-12", 'M')], path, forecast=False) == [(2017, 12)]
+
+    appended = RunningAggregates.load(path)
+    after = appended.year_stamps()
+    assert [year for year in after if after[year] != before[year]] == [2017]
+
+    assert appended.rows == aggregates.rows
+    assert appended.key_indicators() == pytest.approx(aggregates.key_indicators())
+    pd.testing.assert_frame_equal(rollup(appended.cube, 'State'), rollup(aggregates.cube, 'State'))
+
+
+def test_append_without_stored_aggregates(raw, tmp_path):
+    path = str(tmp_path / "aggregates.pkl")
+    touched = append_orders(raw.head(50), path, forecast=False)
+    assert touched and RunningAggregates.load(path).rows == 50
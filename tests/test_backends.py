@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backends import PandasBackend, SQLBackend, SQLiteBackend, export_orders
+from cube import KEYS, METRICS
+
+
+@pytest.fixture(scope="module")
+def pandas_backend(orders):
+    return PandasBackend(orders)
+
+
+@pytest.fixture(scope="module")
+def sqlite_backend(sample_file, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("sqlite") / "orders.db")
+    export_orders(sample_file, path)
+    return SQLiteBackend(path)
+
+
+def sorted_cube(cube):
+    cube = cube.astype({key: str for key in KEYS})
+    return cube.sort_values(KEYS, ignore_index=True)
+
+
+
+def test_cube(pandas_backend, sqlite_backend):
+    expected, cube = sorted_cube(pandas_backend.cube()), sorted_cube(sqlite_backend.cube())
+    pd.testing.assert_frame_equal(cube[KEYS], expected[KEYS])
+    assert (cube['Count'] == expected['Count']).all()
+    assert (cube['Quantity'] == expected['Quantity']).all()
+    for metric in METRICS:
+        np.testing.assert_allclose(cube[metric], expected[metric])
+
+
+def test_distinct_counts_and_years(pandas_backend, sqlite_backend):
+    assert sqlite_backend.distinct_counts() == pandas_backend.distinct_counts()
+    assert sqlite_backend.years() == pandas_backend.years()
+    assert list(sqlite_backend.distinct_customers('Y')) == list(pandas_backend.distinct_customers('Y'))
+
+
+def test_geo_index(pandas_backend, sqlite_backend):
+    expected, geo = pandas_backend.geo_index(), sqlite_backend.geo_index()
+    assert geo.unknown_states == expected.unknown_states
+    for year in [None, 2016]:
+        pd.testing.assert_frame_equal(geo.state_totals("Sales", year), expected.state_totals("Sales", year))
+
+
+@pytest.mark.parametrize("entity", ["Product_ID", "Customer_Name"])
+def test_leaderboards(pandas_backend, sqlite_backend, entity):
+    expected, board = pandas_backend.leaderboard(entity), sqlite_backend.leaderboard(entity)
+    for metric in ['Sales', 'Profit', 'Quantity']:
+        for year in [None, 2014, 2017]:
+            np.testing.assert_allclose(board.top(10, metric, year)[metric], expected.top(10, metric, year)[metric])
+
+
+@pytest.mark.parametrize("start, end, chosen", [
+    (None, None, {}),
+    ("2015-02-01", "2016-11-30", dict(Region=["West", "South"])),
+    ("2017-06-01", None, dict(Segment=["Corporate"], Category=["Technology"], Ship_Mode=["First Class"])),
+    (None, "2013-12-31", {}),
+])
+def test_filters(pandas_backend, sqlite_backend, start, end, chosen):
+    expected, index = pandas_backend.filter_index(), sqlite_backend.filter_index()
+    assert index.values("Region") == expected.values("Region")
+    assert index.date_range() == expected.date_range()
+
+    expected_selection, selection = expected.select(start, end, **chosen), index.select(start, end, **chosen)
+    assert index.count(selection) == expected.count(expected_selection)
+
+    key_indicators, expected_key_indicators = index.key_indicators(selection), expected.key_indicators(expected_selection)
+    for key, value in expected_key_indicators.items():
+        assert key_indicators[key] == pytest.approx(value)
+
+    months, expected_months = index.monthly_totals(selection), expected.monthly_totals(expected_selection)
+    pd.testing.assert_frame_equal(months, expected_months, check_freq=False)
+
+    totals = index.category_totals(selection, "Order_Day", "Quantity")
+    expected_totals = expected.category_totals(expected_selection, "Order_Day", "Quantity")
+    assert list(totals["Order_Day"]) == list(expected_totals["Order_Day"].astype(str))
+    np.testing.assert_allclose(totals["Quantity"].astype(float), expected_totals["Quantity"])
+
+
+def test_year_stamps_are_the_dataset_version(orders, sqlite_backend):
+    assert PandasBackend(orders, "version").year_stamps() == dict.fromkeys([2014, 2015, 2016, 2017], "version")
+    with sqlite_backend.lease() as version:
+        assert sqlite_backend.year_stamps() == dict.fromkeys([2014, 2015, 2016, 2017], version)
+
+
+def test_sql_backend_needs_an_engine(sqlite_backend):
+    with pytest.raises(TypeError):
+        SQLBackend("orders.db")
+    with pytest.raises(ValueError):
+        sqlite_backend.distinct_customers('Q')
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import errors, evaluate_fold, fold_origins, select_models, summarize
+
+
+# A non-seasonal candidate and a seasonal one
+NON_SEASONAL = ((1, 1, 0), (0, 0, 0, 12))
+SEASONAL = ((0, 1, 1), (0, 1, 1, 12))
+
+
+def seasonal_sales(months=48, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2014-01-31", periods=months, freq='M')
+    season = 1 + 0.4 * np.sin(2 * np.pi * np.arange(months) / 12)
+    return pd.Series(40000 * season + 300 * np.arange(months) + rng.normal(0, 500, months), index=index)
+
+
+def summary_row(target, order, metric, cpu_seconds, failed=0.0):
+    return dict(Target=target, Order=str(order[0]), Seasonal_Order=str(order[1]), sMAPE=metric,
+                CPU_Seconds=cpu_seconds, Folds=4, Failed=failed)
+
+
+
+@pytest.mark.parametrize("n_months, expected", [
+    (48, [27, 30, 33, 36]),
+    (40, [25, 28]),
+    (36, [24]),
+    (35, []),
+])
+def test_fold_origins(n_months, expected):
+    assert fold_origins(n_months) == expected
+
+
+def test_errors():
+    scores = errors([100, 200, 0], [110, 180, 0])
+    assert scores["MAE"] == pytest.approx(10)
+    assert scores["RMSE"] == pytest.approx(np.sqrt(500 / 3))
+    # Both zero counts as no error
+    assert scores["sMAPE"] == pytest.approx((20 / 210 + 40 / 380) / 3 * 100)
+
+
+def test_select_models_prefers_the_fastest_accurate_candidate():
+    summary = pd.DataFrame([
+        summary_row("Sales", SEASONAL, 10.0, 0.5),
+        summary_row("Sales", NON_SEASONAL, 10.4, 0.1),
+        summary_row("Sales", ((2, 1, 1), (1, 1, 0, 12)), 9.0, 0.05, failed=0.25),
+        summary_row("State", SEASONAL, 10.0, 0.5),
+        summary_row("State", NON_SEASONAL, 11.0, 0.1),
+    ])
+    selection = select_models(summary, tolerance=0.05)
+
+    # The failed candidate is left out; within 5% of the best, the fastest wins
+    assert (selection["Sales"]["order"], selection["Sales"]["seasonal_order"]) == ([1, 1, 0], [0, 0, 0, 12])
+    assert selection["Sales"]["best_error"] == 10.0
+    assert (selection["State"]["order"], selection["State"]["seasonal_order"]) == ([0, 1, 1], [0, 1, 1, 12])
+
+
+def test_backtest_selects_the_seasonal_model(tmp_path):
+    series = seasonal_sales()
+    rows = [evaluate_fold("Sales", "Sales", series, origin, order, seasonal_order, backtest_dir=str(tmp_path))
+            for origin in fold_origins(len(series)) for order, seasonal_order in [NON_SEASONAL, SEASONAL]]
+    results = pd.DataFrame(rows)
+
+    assert (results["Status"] == "ok").all()
+    assert sorted(set(results["Origin"])) == list(series.index[[26, 29, 32, 35]])
+
+    selection = select_models(summarize(results), tolerance=0.05)
+    assert (tuple(selection["Sales"]["order"]), tuple(selection["Sales"]["seasonal_order"])) == SEASONAL
+
+    # A second run reads every fold from backtest_dir
+    cached = evaluate_fold("Sales", "Sales", series, 36, *SEASONAL, backtest_dir=str(tmp_path))
+    assert cached["Cached"] and cached["sMAPE"] == pytest.approx(results["sMAPE"].iloc[-1])
@@ -0,0 +1,49 @@
+import signal
+import time
+
+import pandas as pd
+import pytest
+
+import batch_forecast
+from batch_forecast import FitTimeout, fit_timeout, load_segment_forecasts, save_forecasts
+
+
+def run(segments, value):
+    forecasts = pd.DataFrame([(segment_type, segment, month, value)
+                              for segment_type, segment in segments
+                              for month in pd.date_range("2018-01-31", periods=12, freq='M')],
+                             columns=['Segment_Type', 'Segment', 'Month', 'Predicted_Sales'])
+    statuses = pd.DataFrame([dict(Segment_Type=segment_type, Segment=segment, Status="ok")
+                             for segment_type, segment in segments])
+    return forecasts, statuses
+
+
+
+def test_partial_run_replaces_only_its_segment_types(tmp_path):
+    files = dict(forecasts_file=str(tmp_path / "segments.parquet"), status_file=str(tmp_path / "status.parquet"))
+    save_forecasts(*run([('State', 'Texas'), ('Sub_Category', 'Chairs'), ('Sub_Category', 'Tables')], 1.0),
+                   ['State', 'Sub_Category'], **files)
+    save_forecasts(*run([('Sub_Category', 'Chairs')], 2.0), ['Sub_Category'], **files)
+
+    stored = load_segment_forecasts(forecasts_file=files["forecasts_file"])
+    totals = stored.groupby(['Segment_Type', 'Segment'])['Predicted_Sales'].sum()
+    assert totals.to_dict() == {('State', 'Texas'): 12.0, ('Sub_Category', 'Chairs'): 24.0}
+    assert list(pd.read_parquet(files["status_file"])['Segment']) == ['Texas', 'Chairs']
+
+
+def test_fit_timeout_interrupts_and_restores_the_handler():
+    handler = signal.getsignal(signal.SIGALRM)
+    with pytest.raises(FitTimeout):
+        with fit_timeout(0.05):
+            time.sleep(2)
+    assert signal.getsignal(signal.SIGALRM) is handler
+
+    with fit_timeout(None):
+        time.sleep(0.01)
+
+
+def test_slow_fit_times_out(monkeypatch):
+    monkeypatch.setattr(batch_forecast, "fit", lambda *args, **kwargs: time.sleep(2))
+    series = pd.Series(range(1, 49), index=pd.date_range("2014-01-31", periods=48, freq='M'), dtype=float)
+    predictions, status = batch_forecast.fit_segment("State", "Texas", series, timeout=0.05)
+    assert predictions is None and status["Status"] == "timeout"
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from cache import Cache, sizeof
+
+
+def block(nbytes):
+    return np.zeros(nbytes, dtype=np.uint8)
+
+
+
+def test_sizeof_counts_the_data_held():
+    frame = pd.DataFrame({"a": np.zeros(1000), "b": np.zeros(1000)})
+    assert sizeof(frame) >= 16000
+    assert sizeof(block(5000)) == 5000
+    assert sizeof((block(100), [block(200)], {"c": block(300)})) >= 600
+
+
+def test_insert_over_max_bytes_evicts_the_oldest_entries():
+    cache = Cache(max_bytes=1000)
+    for key in ["a", "b", "c"]:
+        cache.get(("figure", key, 1), lambda: block(300))
+
+    # Reading "a" makes "b" the least recently used entry
+    cache.get(("figure", "a", 1), lambda: block(300))
+    cache.get(("figure", "d", 1), lambda: block(300))
+    assert sorted(key[1] for key in cache.entries.keys()) == ["a", "c", "d"]
+
+    # Evicts as many of the oldest entries as the new one needs: "c", then "a"
+    cache.get(("figure", "e", 1), lambda: block(700))
+    assert sorted(key[1] for key in cache.entries.keys()) == ["d", "e"]
+    assert cache.stats()["bytes"] <= 1000
+
+
+def test_value_larger_than_the_cache_is_not_stored():
+    cache = Cache(max_bytes=1000)
+    cache.get(("figure", "a", 1), lambda: block(300))
+    assert len(cache.get(("figure", "b", 1), lambda: block(2000))) == 2000
+    assert [key[1] for key in cache.entries.keys()] == ["a"]
+
+
+def test_drop_version():
+    cache = Cache()
+    for version in [1, 2]:
+        cache.get(("artifact", "cube", version), lambda: block(10))
+        cache.get(("figure", "months", version, 2015), lambda: block(10))
+
+    cache.drop_version(1)
+    assert sorted(cache.entries.keys()) == [("artifact", "cube", 2), ("figure", "months", 2, 2015)]
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from charts import OTHER, category_histogram, category_pie, keep_top, payload_size
+from cube import build_cube, rollup
+
+
+COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728"]
+
+
+@pytest.fixture(scope="module")
+def cube(orders):
+    return build_cube(orders)
+
+
+def categories(fig):
+    return set(np.concatenate([np.asarray(trace.x if trace.type == 'histogram' else trace.labels) for trace in fig.data]))
+
+
+def total(fig):
+    return sum(np.asarray(trace.y if trace.type == 'histogram' else trace.values).sum() for trace in fig.data)
+
+
+
+def test_keep_top_sums_the_rest_into_other(cube):
+    table = rollup(cube, ["State", "Order_Year"], ["Sales"])
+    top = keep_top(table, "State", "Sales", 5)
+    assert top["State"].nunique() == 6 and OTHER in set(top["State"])
+    assert top["Sales"].sum() == pytest.approx(table["Sales"].sum())
+    assert len(top) == len(top.drop_duplicates(["State", "Order_Year"]))
+
+
+@pytest.mark.parametrize("chart", [category_histogram, category_pie])
+def test_figure_over_budget_is_downsampled(cube, chart):
+    full = chart(cube, "State", "Sales", COLORS)
+    # Just below the full figure, which also carries a fixed template of a few KB
+    budget = payload_size(full) - 1
+
+    fig = chart(cube, "State", "Sales", COLORS, budget=budget)
+    assert payload_size(fig) <= budget
+    assert OTHER in categories(fig) and len(categories(fig)) < len(categories(full))
+    assert total(fig) == pytest.approx(total(full))
+
+
+@pytest.mark.parametrize("chart", [category_histogram, category_pie])
+def test_figure_within_budget_is_unchanged(cube, chart):
+    fig = chart(cube, "Category", "Sales", COLORS)
+    assert categories(fig) == {"Furniture", "Office Supplies", "Technology"}
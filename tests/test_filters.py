@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cube import METRICS
+from filters import FILTER_DIMS, FilterIndex
+
+
+@pytest.fixture(scope="module")
+def index(orders):
+    return FilterIndex(orders)
+
+
+def expected_positions(orders, start=None, end=None, **chosen):
+
+    """ returns the positions select should return, from boolean masks over the rows """
+
+    mask = np.ones(len(orders), dtype=bool)
+    if start is not None:
+        mask &= orders.index >= pd.Timestamp(start)
+    if end is not None:
+        mask &= orders.index < pd.Timestamp(end) + pd.Timedelta(days=1)
+    for dim, values in chosen.items():
+        if values:
+            mask &= orders[dim].isin(values).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def positions(index, selection):
+
+    """ returns the positions of the selected rows, whether select returned a slice or positions """
+
+    return np.arange(len(index.dates))[selection]
+
+
+
+def test_select_random_filters(orders, index):
+    rng = np.random.default_rng(0)
+    days = pd.date_range("2013-12-01", "2018-01-31")
+
+    for _ in range(300):
+        chosen = {dim: list(rng.choice(index.values(dim), rng.integers(0, 3), replace=False)) for dim in FILTER_DIMS}
+        start, end = sorted(rng.choice(days, 2))
+        start = None if rng.random() < 0.2 else start
+        end = None if rng.random() < 0.2 else end
+        np.testing.assert_array_equal(positions(index, index.select(start, end, **chosen)),
+                                      expected_positions(orders, start, end, **chosen))
+
+
+@pytest.mark.parametrize("start, end", [
+    (None, None),
+    ("2016-03-01", None),
+    (None, "2014-01-31"),
+    ("2015-06-15", "2015-06-15"),
+    ("2010-01-01", "2013-12-31"),
+    ("2018-01-01", "2020-01-01"),
+    ("2010-01-01", "2020-01-01"),
+    ("2016-05-01", "2016-04-01"),
+])
+def test_select_date_ranges(orders, index, start, end):
+    for chosen in [{}, dict(Region=["West"]), dict(Region=["West", "East"], Ship_Mode=["Same Day"])]:
+        np.testing.assert_array_equal(positions(index, index.select(start, end, **chosen)),
+                                      expected_positions(orders, start, end, **chosen))
+
+
+def test_select_without_matches(index):
+    assert len(index.select(Region=["Atlantis"])) == 0
+    assert len(index.select(Region=["West"], Segment=["Nobody"])) == 0
+    assert index.count(index.select("2016-05-01", "2016-04-01")) == 0
+
+
+@pytest.mark.parametrize("start, end, chosen", [
+    ("2015-03-10", "2017-02-20", dict(Category=["Technology", "Furniture"], Segment=["Consumer"])),
+    # Date ranges only: slices aggregated from running totals at the month boundaries
+    ("2015-03-10", "2017-02-20", {}),
+    ("2015-03-01", "2017-02-28", {}),
+    ("2016-07-04", "2016-07-28", {}),
+    ("2016-06-30", "2016-07-01", {}),
+    (None, None, {}),
+])
+def test_aggregates_match_pandas(orders, index, start, end, chosen):
+    selection = index.select(start, end, **chosen)
+    rows = orders.iloc[expected_positions(orders, start, end, **chosen)]
+
+    key_indicators = index.key_indicators(selection)
+    assert key_indicators["unique_products"] == rows["Product_ID"].nunique()
+    assert key_indicators["unique_customers"] == rows["Customer_ID"].nunique()
+    assert key_indicators["total_products_sold"] == rows["Quantity"].sum()
+    for key, metric in [("total_sales", "Sales"), ("total_discounts", "Discount"), ("net_profit", "Profit")]:
+        assert key_indicators[key] == pytest.approx(rows[metric].sum())
+
+    months = index.monthly_totals(selection, "Profit")
+    pd.testing.assert_series_equal(months["Profit"], rows["Profit"].resample('M').sum(), check_names=False,
+                                   check_freq=False)
+
+    for cat in ["Order_Month", "Sub_Category"]:
+        for metric in METRICS:
+            totals = index.category_totals(selection, cat, metric)
+            expected = rows.groupby(cat, observed=True)[metric].sum()
+            assert list(totals[cat]) == list(expected.index)
+            np.testing.assert_allclose(totals[metric], expected.to_numpy())
+
+
+@pytest.mark.parametrize("start, end, chosen", [
+    (None, None, dict(Region=["Atlantis"])),
+    ("2016-05-01", "2016-04-01", {}),
+    ("2010-01-01", "2013-12-31", {}),
+])
+def test_empty_selection_aggregates(index, start, end, chosen):
+    selection = index.select(start, end, **chosen)
+    assert index.key_indicators(selection)["total_sales"] == 0
+    assert index.key_indicators(selection)["unique_customers"] == 0
+    assert len(index.monthly_totals(selection)) == 0
+    assert len(index.category_totals(selection, "Category")) == 0
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import forecast
+from forecast import KEEP_ENTRIES, get_forecast, series_hash
+
+
+def monthly_sales(months, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2014-01-31", periods=months, freq='M')
+    season = 1 + 0.3 * np.sin(2 * np.pi * np.arange(months) / 12)
+    return pd.Series(50000 * season + 500 * np.arange(months) + rng.normal(0, 2000, months), index=index)
+
+
+@pytest.fixture
+def fits(monkeypatch):
+
+    """ records the start parameters of every model fit """
+
+    calls = []
+    fit = forecast.fit
+
+    def counting_fit(series, order=forecast.ORDER, seasonal_order=forecast.SEASONAL_ORDER, start_params=None):
+        calls.append(start_params)
+        return fit(series, order, seasonal_order, start_params=start_params)
+
+    monkeypatch.setattr(forecast, "fit", counting_fit)
+    return calls
+
+
+def wait_for_refit(series):
+    with forecast._lock:
+        thread = forecast._refits.get(series_hash(series))
+    if thread is not None:
+        thread.join()
+
+
+
+def test_stored_forecast_is_reused(fits, tmp_path):
+    series = monthly_sales(48)
+    predictions, up_to_date = get_forecast(series, forecast_dir=str(tmp_path))
+    assert up_to_date and len(predictions) == forecast.HORIZON
+
+    stored, up_to_date = get_forecast(series.copy(), forecast_dir=str(tmp_path))
+    assert up_to_date
+    pd.testing.assert_frame_equal(stored, predictions)
+    assert fits == [None]
+
+
+def test_changed_series_is_refit(fits, tmp_path):
+    series, extended = monthly_sales(48), monthly_sales(49)
+    first, _ = get_forecast(series, forecast_dir=str(tmp_path))
+
+    predictions, up_to_date = get_forecast(extended, background=False, forecast_dir=str(tmp_path))
+    assert up_to_date and not predictions.equals(first)
+    # A new month only extends the stored series, so the fit starts from its parameters
+    assert fits[0] is None and fits[1] is not None
+
+    revised = extended.copy()
+    revised.iloc[10] *= 2
+    get_forecast(revised, background=False, forecast_dir=str(tmp_path))
+    assert len(fits) == 3 and fits[2] is None
+
+
+def test_background_refit_serves_previous_predictions(fits, tmp_path):
+    series, extended = monthly_sales(48), monthly_sales(49)
+    first, _ = get_forecast(series, forecast_dir=str(tmp_path))
+
+    predictions, up_to_date = get_forecast(extended, forecast_dir=str(tmp_path))
+    assert not up_to_date
+    pd.testing.assert_frame_equal(predictions, first)
+
+    wait_for_refit(extended)
+    predictions, up_to_date = get_forecast(extended, forecast_dir=str(tmp_path))
+    assert up_to_date and not predictions.equals(first)
+    assert len(fits) == 2
+
+
+def test_old_entries_are_pruned(tmp_path):
+    for months in range(40, 45):
+        get_forecast(monthly_sales(months), background=False, forecast_dir=str(tmp_path))
+
+    entries = [name for name in os.listdir(tmp_path) if forecast.ENTRY_FILE.match(name)]
+    assert len(entries) == KEEP_ENTRIES
+    assert forecast.latest_entry(str(tmp_path))["key"] + ".pkl" in entries
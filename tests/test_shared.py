@@ -0,0 +1,53 @@
+import shutil
+
+import pytest
+
+from cache import Cache
+from shared import SharedDataset
+
+
+@pytest.fixture
+def order_file(sample_file, tmp_path, monkeypatch):
+
+    """ a copy of the sample the test can rewrite, with the Arrow cache written next to it """
+
+    monkeypatch.chdir(tmp_path)
+    return shutil.copy(sample_file, tmp_path / "orders.csv")
+
+
+def rewrite(path, lines):
+    with open(path, encoding='latin1') as f:
+        head = f.readlines()[:lines]
+    with open(path, "w", encoding='latin1') as f:
+        f.writelines(head)
+
+
+
+def test_released_lease_drops_the_version(order_file):
+    cache = Cache()
+    dataset = SharedDataset(str(order_file), cache=cache)
+
+    with dataset.lease() as old:
+        cache.get(("artifact", "cube", old), lambda: "old cube")
+        rewrite(order_file, 5001)
+
+        with dataset.lease() as new:
+            cache.get(("artifact", "cube", new), lambda: "new cube")
+            # The old version is still leased by the outer block
+            assert new != old and len(dataset.data(new)) == 5000
+            assert dataset.stats() == dict(versions=2, leases=2)
+            assert ("artifact", "cube", old) in cache.entries
+
+    # Its last lease ended, so the old table and its artifacts are released; the current version stays
+    assert dataset.stats() == dict(versions=1, leases=0)
+    assert list(cache.entries.keys()) == [("artifact", "cube", new)]
+    assert len(dataset.data(new)) == 5000
+    with pytest.raises(KeyError):
+        dataset.data(old)
+
+
+def test_current_version_is_shared(order_file):
+    dataset = SharedDataset(str(order_file), cache=Cache())
+    with dataset.lease() as first, dataset.lease() as second:
+        assert first == second and dataset.data(first) is dataset.data(second)
+    assert dataset.stats() == dict(versions=1, leases=0)
@@ -0,0 +1,105 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import artifacts
+import snapshot
+from backends import SQLiteBackend, export_orders
+from registry import Registry
+from shared import SharedDataset
+from snapshot import SNAPSHOT_ARTIFACTS, build_snapshot, serve_snapshot
+
+
+def figure_data(fig):
+    return json.loads(fig.to_json())
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+
+    """ runs the test in tmp_path, so the Arrow file, the forecast and the bundle are written there """
+
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / "snapshots")
+
+
+
+def test_round_trip(sample_file, snapshot_dir, monkeypatch):
+    shared = SharedDataset(sample_file)
+    monkeypatch.setattr(artifacts, "shared", shared)
+
+    with shared.lease() as version:
+        bundle = build_snapshot(artifacts.registry, version, snapshot_dir)
+        built = {name: artifacts.registry.get(name, version) for name in SNAPSHOT_ARTIFACTS}
+        artifacts.registry.forget(version)
+
+    assert sorted(os.listdir(snapshot_dir)) == sorted([os.path.basename(bundle), "latest.json"])
+
+    registry = Registry()
+    snapshot = serve_snapshot(registry, snapshot_dir)
+    assert snapshot.version == version
+    served = {name: registry.get(name, version) for name in SNAPSHOT_ARTIFACTS}
+
+    assert served["years"] == built["years"]
+    assert served["key_indicators"] == built["key_indicators"]
+    for freq, table in built["periods"].items():
+        pd.testing.assert_frame_equal(served["periods"][freq], table)
+
+    predictions, up_to_date = served["forecast"]
+    pd.testing.assert_frame_equal(predictions, built["forecast"][0])
+    assert up_to_date
+
+    for name in ["months_fig", "year_fig", "forecast_fig", "geo_fig"]:
+        assert figure_data(served[name]) == figure_data(built[name])
+
+    pd.testing.assert_frame_equal(served["geo_index"].table, built["geo_index"].table)
+    for entity, board in built["leaderboards"].items():
+        for year in [None] + built["years"]:
+            pd.testing.assert_frame_equal(served["leaderboards"][entity].top(10, "Quantity", year),
+                                          board.top(10, "Quantity", year))
+
+    for indicator in artifacts.INDICATORS:
+        for year in [None] + built["years"]:
+            assert [figure_data(fig) for fig in served["figures"].category_figs(indicator, year)] == \
+                [figure_data(fig) for fig in built["figures"].category_figs(indicator, year)]
+    for year in built["years"]:
+        assert figure_data(served["figures"].month_fig(year)) == figure_data(built["figures"].month_fig(year))
+
+
+def test_sqlite_backend(sample_file, snapshot_dir, tmp_path, monkeypatch):
+    export_orders(sample_file, str(tmp_path / "orders.db"))
+    backend = SQLiteBackend(str(tmp_path / "orders.db"))
+    monkeypatch.setattr(artifacts, "sql_backend", backend)
+
+    with backend.lease() as version:
+        build_snapshot(artifacts.registry, version, snapshot_dir)
+        built = artifacts.registry.get("leaderboards", version)
+        artifacts.registry.forget(version)
+
+    registry = Registry()
+    serve_snapshot(registry, snapshot_dir)
+    served = registry.get("leaderboards", version)
+
+    # The SQL leaderboards are served from the results of the pages' queries, without a connection
+    for entity in ["Product_ID", "Customer_Name"]:
+        assert served[entity].backend is None
+        for year in [None] + registry.get("years", version):
+            pd.testing.assert_frame_equal(served[entity].top(artifacts.TOP_K, artifacts.TOP_METRIC, year),
+                                          built[entity].top(artifacts.TOP_K, artifacts.TOP_METRIC, year))
+
+
+def test_failed_build_leaves_no_bundle(sample_file, snapshot_dir, monkeypatch):
+    shared = SharedDataset(sample_file)
+    monkeypatch.setattr(artifacts, "shared", shared)
+
+    def fail(value, directory, name):
+        raise TypeError("cannot pickle " + name)
+
+    monkeypatch.setattr(snapshot, "dump_value", fail)
+    with shared.lease() as version, pytest.raises(TypeError):
+        build_snapshot(artifacts.registry, version, snapshot_dir)
+    artifacts.registry.forget(version)
+
+    assert os.listdir(snapshot_dir) == []
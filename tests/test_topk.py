@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import RunningAggregates, append_orders
+from ingest import CSV_DTYPES
+from topk import Leaderboard, top_positions
+
+
+YEARS = [None, 2014, 2015, 2016, 2017]
+
+METRICS = ['Sales', 'Profit', 'Quantity']
+
+
+
+def query_all(board, k=10):
+
+    """ builds every leaderboard of board, so an update has boards to keep current """
+
+    for metric in METRICS:
+        for year in YEARS:
+            board.top(k, metric, year)
+
+
+def assert_same_top(board, expected, k=10):
+
+    """ compares the top-k metric values, which are unique to the ranking even where entities tie """
+
+    for metric in METRICS:
+        for year in YEARS:
+            np.testing.assert_allclose(board.top(k, metric, year)[metric], expected.top(k, metric, year)[metric])
+
+
+@pytest.mark.parametrize("k", [0, 1, 5, 99, 100, 150])
+def test_top_positions_matches_full_sort(k):
+    values = np.random.default_rng(k).permutation(100).astype(float)
+    assert list(top_positions(values, k)) == list(np.argsort(-values)[:k])
+
+
+def test_leaderboard_matches_groupby(orders):
+    board = Leaderboard.from_rows(orders, "Product_ID")
+
+    for metric in METRICS:
+        for year in YEARS:
+            rows = orders if year is None else orders[orders['Order_Year'] == year]
+            totals = rows.groupby("Product_ID", observed=True)[metric].sum()
+            expected = np.sort(totals.nlargest(10).to_numpy())
+            np.testing.assert_allclose(board.top(10, metric, year)[metric], expected)
+
+
+@pytest.mark.parametrize("max_k", [5, 100])
+def test_update_matches_rebuild(orders, max_k):
+    new = np.random.default_rng(0).random(len(orders)) < 0.3
+    board = Leaderboard.from_rows(orders[~new], "Customer_Name", max_k)
+    query_all(board, max_k)
+
+    board.update(orders[new])
+    assert_same_top(board, Leaderboard.from_rows(orders, "Customer_Name", max_k), k=max_k)
+
+
+def test_update_adds_years_and_entities(orders):
+    old = orders['Order_Year'] < 2017
+    board = Leaderboard.from_rows(orders[old], "Product_ID")
+    query_all(board)
+
+    board.update(orders[~old])
+    assert_same_top(board, Leaderboard.from_rows(orders, "Product_ID"))
+
+
+def test_negative_deltas_rebuild_the_board(orders):
+    losses = orders['Profit'] < 0
+    board = Leaderboard.from_rows(orders[~losses], "Product_ID", max_k=10)
+    board.top(10, "Profit")
+    board.top(10, "Sales")
+
+    board.update(orders[losses])
+
+    # Profit totals fell, so its board is dropped and rebuilt on the next query; Sales only grew
+    assert "Profit" not in board.scopes[None].boards
+    assert "Sales" in board.scopes[None].boards
+    assert_same_top(board, Leaderboard.from_rows(orders, "Product_ID", max_k=10))
+
+
+def test_append_updates_the_stored_leaderboards(sample_file, orders, tmp_path):
+    raw = pd.read_csv(sample_file, encoding='latin1', dtype=CSV_DTYPES)
+    year = pd.to_datetime(raw['Order_Date'], format="%m/%d/%Y").dt.year
+    base = tmp_path / "base.csv"
+    raw[year < 2017].to_csv(base, index=False)
+
+    path = str(tmp_path / "aggregates.pkl")
+    append_orders(raw[year == 2017], path, base=str(base), forecast=False)
+
+    aggregates = RunningAggregates.load(path)
+    for entity, board in aggregates.leaderboards.items():
+        assert_same_top(board, Leaderboard.from_rows(orders, entity))
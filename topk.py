@@ -0,0 +1,148 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from cube import METRICS
+
+
+# Length of the precomputed leaderboards; larger K are answered with a partial selection
+MAX_K = 100
+
+# Entity types with leaderboards, see build_leaderboards
+ENTITIES = ['Product_ID', 'Customer_Name', 'City']
+
+
+
+# ______________________________________________ HELPER FUNCTIONS __________________________________________________________
+def top_positions(values, k):
+
+    """ returns the positions of the k largest values, largest first, using a partial selection
+    (argpartition) so only the k selected values are sorted """
+
+    if k <= 0:
+        return np.array([], dtype=int)
+
+    if k >= len(values):
+        return np.argsort(-values, kind='stable')
+
+    positions = np.argpartition(-values, k - 1)[:k]
+    return positions[np.argsort(-values[positions], kind='stable')]
+
+
+
+class _Scope:
+
+    """ metric totals of every entity within one year, or over all years """
+
+    def __init__(self, names, totals, max_k):
+        self.names = np.asarray(names, dtype=object)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.totals = np.asarray(totals, dtype=float).reshape(len(self.names), len(METRICS))
+        self.max_k = max_k
+        self.boards = {}
+
+    @property
+    def nbytes(self):
+        return (self.names.nbytes + self.totals.nbytes + sys.getsizeof(self.index)
+                + sum(board.nbytes for board in self.boards.values()))
+
+    def board(self, metric):
+
+        """ returns the positions of the max_k entities with the largest metric, largest first """
+
+        if metric not in self.boards:
+            self.boards[metric] = top_positions(self.totals[:, METRICS.index(metric)], self.max_k)
+        return self.boards[metric]
+
+    def top(self, k, metric):
+        if k <= self.max_k:
+            return self.board(metric)[:k]
+        return top_positions(self.totals[:, METRICS.index(metric)], k)
+
+    def add(self, names, totals):
+
+        """ adds metric totals of (possibly new) entities and updates the leaderboards """
+
+        new = [name for name in dict.fromkeys(names) if name not in self.index]
+        if new:
+            for name in new:
+                self.index[name] = len(self.index)
+            self.names = np.concatenate([self.names, np.asarray(new, dtype=object)])
+            self.totals = np.vstack([self.totals, np.zeros((len(new), len(METRICS)))])
+
+        rows = np.array([self.index[name] for name in names], dtype=int)
+        np.add.at(self.totals, rows, totals)
+
+        for metric, board in list(self.boards.items()):
+            column = METRICS.index(metric)
+            if (totals[:, column] >= 0).all():
+                # Totals only grew, so the new leaders are among the old leaders and the updated rows
+                candidates = np.union1d(board, rows)
+                self.boards[metric] = candidates[top_positions(self.totals[candidates, column], self.max_k)]
+            else:
+                del self.boards[metric]
+
+
+
+# ______________________________________________ LEADERBOARDS _____________________________________________________________
+class Leaderboard:
+
+    """ per-year and all-years leaderboards of one entity type (products, customers, cities) for
+    every metric, answering top-K queries in O(K) for K up to max_k """
+
+    def __init__(self, table, entity, max_k=MAX_K):
+
+        # table holds one row of metric sums per (Order_Year, entity)
+        self.entity = entity
+        self.max_k = max_k
+        self.scopes = {}
+
+        for year, part in table.groupby('Order_Year'):
+            self.scopes[int(year)] = _Scope(part[entity], part[METRICS].to_numpy(), max_k)
+
+        overall = table.groupby(entity, observed=True)[METRICS].sum()
+        self.scopes[None] = _Scope(overall.index, overall.to_numpy(), max_k)
+
+    @property
+    def nbytes(self):
+        return sum(scope.nbytes for scope in self.scopes.values())
+
+    @classmethod
+    def from_rows(cls, data, entity, max_k=MAX_K):
+        table = data.groupby(['Order_Year', entity], observed=True)[METRICS].sum().reset_index()
+        return cls(table, entity, max_k)
+
+    def top(self, k=10, metric="Quantity", year=None):
+
+        """ returns the k entities with the largest metric, in ascending order for horizontal bars """
+
+        scope = self.scopes.get(None if year is None else int(year))
+        if scope is None:
+            return pd.DataFrame(columns=[self.entity] + METRICS)
+
+        positions = scope.top(k, metric)[::-1]
+        top = pd.DataFrame(scope.totals[positions], columns=METRICS)
+        top.insert(0, self.entity, scope.names[positions])
+        return top
+
+    def update(self, rows):
+
+        """ folds new preprocessed order rows into the leaderboards """
+
+        table = rows.groupby(['Order_Year', self.entity], observed=True)[METRICS].sum().reset_index()
+
+        for year, part in table.groupby('Order_Year'):
+            if int(year) not in self.scopes:
+                self.scopes[int(year)] = _Scope([], np.zeros((0, len(METRICS))), self.max_k)
+            self.scopes[int(year)].add(list(part[self.entity]), part[METRICS].to_numpy(dtype=float))
+
+        overall = table.groupby(self.entity, observed=True)[METRICS].sum()
+        self.scopes[None].add(list(overall.index), overall.to_numpy(dtype=float))
+
+
+def build_leaderboards(data, max_k=MAX_K):
+
+    """ returns a Leaderboard per entity type in ENTITIES """
+
+    return {entity: Leaderboard.from_rows(data, entity, max_k) for entity in ENTITIES}